@@ -1,5 +1,4 @@
 from candidate import CandidateFinder, Candidate
-import re
 
 MAX_LENGTH = 10000
 
@@ -51,12 +50,16 @@ class BoxPhraseCandidateFinder(CandidateFinder):
         else:
             return self._min_page <= box.page
 
+    def page_range(self):
+        """Boxes are only considered on pages within the search bounds."""
+        return self._min_page, self._max_page or None
+
     def _has_phrase(self, box):
         """Determine whether a box has the sought phrases."""
         lines = box.get_lines()
-        pattern = self.field.settings.pattern_builder.list_pattern(self._phrases)
+        regex = self.field.settings.pattern_builder.list_regex(self._phrases)
         for line in lines:
-            if re.search(pattern, line.text) is not None:
+            if regex.search(line.text) is not None:
                 return True
         return False
 
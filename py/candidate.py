@@ -11,6 +11,14 @@ class CandidateFinder:
     def get_candidates(self, document):
         pass
 
+    def page_range(self):
+        """ Get the range of pages this finder looks for candidates on.
+
+        :return: A 2-tuple of the first and last page numbers, where the last
+         is None if there is no limit.
+        """
+        return 0, None
+
 
 class Candidate(object):
     """Base candidate class."""
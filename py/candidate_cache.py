@@ -0,0 +1,120 @@
+"""A persistent cache of candidate data, so that exports only redo changed work."""
+
+import hashlib
+import json
+import os
+import pickle
+
+
+class CandidateCache(object):
+    """Store candidates, feature values, scores, and values on disk.
+
+    Entries are kept per document and field, under a key derived from
+    everything that determines which candidates a field finds: its
+    definition (apart from features and model), the OCR substitutions and
+    the labels of all fields. Feature columns are stored under a hash of
+    each feature's own definition, so adding or changing a feature only
+    requires that column to be computed.
+
+    Changes to code or to files referenced by the settings (such as word
+    lists) are not detected; clear the cache directory after making them.
+    """
+    def __init__(self, directory):
+        """Set the directory in which to store the cache."""
+        self._directory = directory
+        self._candidate_keys = {}
+
+    def _hash(self, obj):
+        """Hash a JSON-serializable object."""
+        data = json.dumps(obj, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def candidate_key(self, field):
+        """Get a key for the configuration that determines a field's candidates."""
+        try:
+            return self._candidate_keys[field.name]
+        except KeyError:
+            definition = {key: field._data[key] for key in field._data
+                          if key not in ('features', 'model_definition')}
+            settings = field.settings
+            key = self._hash([definition, settings.substitutions(), settings.all_labels])
+            self._candidate_keys[field.name] = key
+            return key
+
+    def feature_key(self, field, name):
+        """Get a key for the definition of one of a field's features."""
+        return self._hash(field._data['features'][name])
+
+    def document_key(self, document):
+        """Get a key identifying a document's content.
+
+        Candidate ids contain the document id, so it is part of the key. So is
+        the file's hash, when recorded, in case the id is reused for another file.
+        """
+        digest = getattr(document, 'file_hash', None)
+        if digest is None:
+            return str(document.id)
+        return "%s_%s" % (document.id, digest[:16])
+
+    def _path(self, field, document):
+        return os.path.join(self._directory, field.name, self.candidate_key(field),
+                            self.document_key(document) + ".pkl")
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def load(self, field, document):
+        """ Load the cached data for a document.
+
+        :param field: A Field object.
+        :param document: A Document object.
+        :return: A dict with keys 'ids', 'values', 'label', 'scores' and
+         'features', or None if nothing is cached. 'features' maps the names
+         of the field's features to arrays, and only contains the features
+         whose current definitions have been computed.
+        """
+        stored = self._read(self._path(field, document))
+        if stored is None:
+            return None
+        features = {}
+        for name in field.features:
+            try:
+                features[name] = stored['features'][self.feature_key(field, name)]
+            except KeyError:
+                pass
+        entry = dict(stored)
+        entry['features'] = features
+        return entry
+
+    def save(self, field, document, entry):
+        """ Save the data for a document.
+
+        Feature columns that are already cached under other definitions are kept.
+        :param field: A Field object.
+        :param document: A Document object.
+        :param entry: A dict as returned by load.
+        """
+        path = self._path(field, document)
+        stored = self._read(path)
+        features = stored['features'] if stored is not None and stored['ids'] == entry['ids'] else {}
+        for name in entry['features']:
+            features[self.feature_key(field, name)] = entry['features'][name]
+        stored = dict(entry)
+        stored['features'] = features
+
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process may have created it in the meantime.
+                if not os.path.isdir(directory):
+                    raise
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            pickle.dump(stored, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_path, path)
@@ -0,0 +1,193 @@
+"""Compute and hold the candidate data used for training and prediction."""
+
+from document_index import DocumentIndex
+import numpy as np
+import pandas as pd
+
+
+def _new_entry(candidates, features):
+    """Gather a document's candidate data from its candidates and feature frame."""
+    ids = list(features.index)
+    value_by_id = {candidate.id: candidate.value for candidate in candidates}
+    return {'ids': ids,
+            'values': [value_by_id[cid] for cid in ids],
+            'label': None,
+            'scores': None,
+            'features': {name: features[name].values for name in features.columns}}
+
+
+def _compare(field, label, value):
+    """Compare a candidate value to a label, scoring 0 if they can't be compared."""
+    try:
+        return field.compare(label, value)
+    except TypeError:
+        return 0
+
+
+def document_entries(field, documents, cache=None):
+    """ Get candidate data for each of a list of documents.
+
+    Only the work that isn't already cached is done: candidates are found
+    only for documents missing some feature, those features are computed
+    in one batch, and scores are recomputed only if the label has changed.
+    :param field: A Field object.
+    :param documents: A list of Document objects.
+    :param cache: A CandidateCache, or None to compute everything.
+    :return: A list of dicts (as described in CandidateCache.load), one per document.
+    """
+    entries = [cache.load(field, document) if cache is not None else None
+               for document in documents]
+
+    #Group documents by the features they are missing.
+    missing = {}
+    for i, entry in enumerate(entries):
+        have = entry['features'] if entry is not None else {}
+        names = tuple(sorted(name for name in field.features if name not in have))
+        if names:
+            missing.setdefault(names, []).append(i)
+
+    for names in sorted(missing):
+        positions = missing[names]
+        candidates = [field.get_candidates(documents[i]) for i in positions]
+        features = field.features_dataframe(candidates, list(names))
+        doc_ids = features.index.get_level_values('document') if len(features) else []
+        for i, doc_candidates in zip(positions, candidates):
+            if len(doc_candidates) == 0:
+                doc_features = pd.DataFrame(columns=list(names))
+            else:
+                #Features are sorted by document, so each document's rows are contiguous.
+                doc_id = doc_candidates[0].id[0]
+                start = np.searchsorted(doc_ids, doc_id, side='left')
+                end = np.searchsorted(doc_ids, doc_id, side='right')
+                doc_features = features.iloc[start:end]
+            entry = entries[i]
+            if entry is None or entry['ids'] != list(doc_features.index):
+                # Not cached, or found different candidates: start over.
+                if entry is not None:
+                    doc_features = field.features_dataframe([doc_candidates])
+                entry = _new_entry(doc_candidates, doc_features)
+                entries[i] = entry
+            else:
+                for name in names:
+                    entry['features'][name] = doc_features[name].values
+
+    for document, entry in zip(documents, entries):
+        label = getattr(document, field.name)
+        if entry['scores'] is None or entry['label'] != label:
+            entry['scores'] = [_compare(field, label, value) for value in entry['values']]
+            entry['label'] = label
+
+    if cache is not None:
+        for document, entry in zip(documents, entries):
+            cache.save(field, document, entry)
+    return entries
+
+
+def candidate_data(field, documents, cache=None):
+    """ Compute features, scores, and values for all candidates in some documents.
+
+    :param field: A Field object.
+    :param documents: A list of Document objects.
+    :param cache: A CandidateCache, or None to compute everything.
+    :return: A 3-tuple of a features DataFrame, a scores DataFrame, and a values
+     DataFrame, all indexed by candidate id.
+    """
+    entries = document_entries(field, documents, cache)
+    ids = [cid for entry in entries for cid in entry['ids']]
+    if len(ids) == 0:
+        features = pd.DataFrame()
+        index = None
+    else:
+        index = pd.MultiIndex.from_tuples(ids, names=['document', 'finder', 'num'])
+        names = sorted(field.features)
+        features = pd.DataFrame({name: np.concatenate([entry['features'][name] for entry in entries])
+                                 for name in names}, index=index, columns=names).sort_index()
+
+    scores = pd.DataFrame({"%s_score" % field.name:
+                           [s for entry in entries for s in entry['scores']]},
+                          index=index).sort_index()
+    values = pd.DataFrame({"%s_value" % field.name:
+                           [v for entry in entries for v in entry['values']]},
+                          index=index).sort_index()
+    return features, scores, values
+
+
+def _sorted(frame):
+    """Sort a frame by its index, without copying it if it is sorted already.
+
+    Exported data is written in order, so memory-mapped exports stay mapped.
+    """
+    if frame.index.is_monotonic_increasing:
+        return frame
+    return frame.sort_index()
+
+
+class CandidateData(object):
+    """Features, scores, and values for the candidates of a list of documents.
+
+    Documents are referred to by their position in document_ids, so a
+    ModelWrapper holding this data can be fitted and cross-validated on
+    arrays of positions. The data is read-only and is never copied: deep
+    copies (as made when GridSearchCV clones an estimator) return the same
+    object, so candidates are found and features computed only once.
+    """
+    def __init__(self, document_ids, features, scores, values):
+        """ Store the data.
+
+        :param document_ids: The ids of the documents, in order.
+        :param features: A DataFrame of features indexed by candidate id.
+        :param scores: A Series of scores indexed by candidate id.
+        :param values: A Series of values indexed by candidate id.
+        """
+        self.document_ids = np.asarray(document_ids)
+        self.features = _sorted(features)
+        self.scores = _sorted(scores)
+        self.values = _sorted(values)
+        self._rows = DocumentIndex.from_frame(self.features)
+
+    @classmethod
+    def from_documents(cls, field, documents, cache=None):
+        """ Find candidates and compute features for a list of documents.
+
+        Scores are computed against the documents' current field values.
+        :param field: A Field object.
+        :param documents: A list of Document objects.
+        :param cache: A CandidateCache, or None to compute everything.
+        :return: A CandidateData object.
+        """
+        features, scores, values = candidate_data(field, documents, cache)
+        return cls([document.id for document in documents], features,
+                   scores["%s_score" % field.name], values["%s_value" % field.name])
+
+    def __len__(self):
+        return len(self.document_ids)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def rows(self, positions):
+        """ Get the row numbers of the candidates of some documents.
+
+        :param positions: An array of document positions.
+        :return: An array of row numbers, grouped by document in order of position.
+        """
+        documents = self._rows.documents
+        ids = self.document_ids[np.sort(np.asarray(positions, dtype=int))]
+        if len(documents) == 0 or len(ids) == 0:
+            return np.array([], dtype=int)
+        where = np.minimum(np.searchsorted(documents, ids), len(documents) - 1)
+        where = where[documents[where] == ids]
+        starts, ends = self._rows.starts[where], self._rows.ends[where]
+        lengths = ends - starts
+        # Concatenate the ranges [start, end) without a Python loop.
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def take(self, positions):
+        """ Get the features, scores, and values for some documents.
+
+        :param positions: An array of document positions.
+        :return: A 3-tuple of features, scores, and values.
+        """
+        rows = self.rows(positions)
+        return self.features.iloc[rows], self.scores.iloc[rows], self.values.iloc[rows]
@@ -2,12 +2,108 @@
 
 from settings import Settings
 from argparse import ArgumentParser
-from pdf_classes import *
-import pandas as pd
-from sqlalchemy.orm import joinedload
-from os import path
+from candidate_cache import CandidateCache
+from candidate_data import candidate_data
+from export_format import FORMATS, open_writer, merge_parts
+from document_loader import id_shards, iter_compact_chunks
+from multiprocessing import Pool
 import uuid
 
+
+def export_documents(session, is_test, fields, writers, chunk_size=None, cache=None,
+                     first_id=None, last_id=None):
+    """ Compute and write candidate data for a set of documents.
+
+    :param session: A SQLAlchemy session.
+    :param is_test: Whether to export the test set rather than the training set.
+    :param fields: A dict of the Field objects to export, keyed by name.
+    :param writers: A dict of export writers, keyed by field name. They are closed when done.
+    :param chunk_size: The number of documents to process at a time, or None for all at once.
+    :param cache: A CandidateCache, or None.
+    :param first_id: If not None, the smallest document id to export.
+    :param last_id: If not None, the largest document id to export.
+    """
+    #Compute features, scores, and values for candidates a chunk of documents at a time,
+    #appending each chunk to the output files.
+    for documents in iter_compact_chunks(session, is_test, chunk_size, first_id, last_id):
+        for field_name, field in fields.iteritems():
+            labeled = [document for document in documents
+                       if getattr(document, field_name) is not None]
+            writers[field_name].write(*candidate_data(field, labeled, cache))
+    for writer in writers.values():
+        writer.close()
+
+
+#The settings and options of a worker process, set by _init_worker.
+_worker = {}
+
+
+def _init_worker(settings_path, options):
+    """Load the settings in a worker process and open its own database session."""
+    from sqlalchemy.orm import class_mapper
+    from sqlalchemy.orm.exc import UnmappedClassError
+    from pdf_classes import Document
+    settings = Settings(settings_path)
+    try:
+        class_mapper(Document)
+    except UnmappedClassError:
+        #Not inherited from the parent process, so map the tables here.
+        settings.map_tables()
+    _worker.update(options)
+    _worker['settings'] = settings
+    _worker['session'] = settings.session()
+
+
+def export_shard(shard):
+    """ Export the candidate data for a range of document ids in a worker process.
+
+    :param shard: A tuple of the shard number and the first and last document ids in it.
+    :return: The token the shard's partial output was written under.
+    """
+    number, first_id, last_id = shard
+    settings, session = _worker['settings'], _worker['session']
+    fields = {name: settings.fields[name] for name in _worker['fields']}
+    part_token = "%s.part%04d" % (_worker['token'], number)
+    writers = {field_name: open_writer(_worker['format'], _worker['directory'],
+                                       field_name, _worker['dataset'], part_token)
+               for field_name in fields}
+    cache = CandidateCache(settings.get_directory('cache')) if _worker['cache'] else None
+    try:
+        export_documents(session, _worker['test'], fields, writers, _worker['chunk_size'],
+                         cache, first_id, last_id)
+    finally:
+        session.rollback()
+    return part_token
+
+
+def export_parallel(settings_path, session, fields, args, directory, dataset, token):
+    """ Export candidate data with a pool of worker processes.
+
+    The documents are split into contiguous ranges of ids, one per worker, and
+    each worker writes partial output for its range. The parts are then
+    concatenated in order of id, so the output does not depend on the number
+    of workers.
+    """
+    shards = id_shards(session, args.test, args.workers)
+    session.close()
+    #Don't let the workers inherit pooled connections.
+    session.bind.dispose()
+    options = {'fields': sorted(fields), 'test': args.test, 'cache': args.cache,
+               'format': args.format, 'chunk_size': args.chunk_size,
+               'directory': directory, 'dataset': dataset, 'token': str(token)}
+    pool = Pool(args.workers, _init_worker, (settings_path, options))
+    try:
+        part_tokens = pool.map(export_shard, [(number, first_id, last_id) for
+                                              number, (first_id, last_id) in enumerate(shards)])
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    for field_name in fields:
+        merge_parts(args.format, directory, field_name, dataset, part_tokens, token)
+
+
 if __name__ == '__main__':
     parser = ArgumentParser(description='Compute features for lines')
     parser.add_argument('--settings', help='the path to the settings file',
@@ -16,6 +112,14 @@ if __name__ == '__main__':
                         nargs='*', default=None)
     parser.add_argument('--test', help='flag indicating that test set should be used',
                         action='store_true', default=False)
+    parser.add_argument('--cache', help='reuse and update cached candidate data',
+                        action='store_true', default=False)
+    parser.add_argument('--format', help='the file format to export to',
+                        choices=FORMATS, default='csv')
+    parser.add_argument('--chunk-size', help='the number of documents to process at a time',
+                        type=int, default=None)
+    parser.add_argument('--workers', help='the number of processes to export with',
+                        type=int, default=1)
     args = parser.parse_args()
 
     settings = Settings(args.settings)
@@ -23,6 +127,7 @@ if __name__ == '__main__':
     session = settings.session()
     csv_directory = settings.get_directory('csv')
     token = uuid.uuid1()
+    cache = CandidateCache(settings.get_directory('cache')) if args.cache else None
 
     dataset = "test" if args.test else "training"
 
@@ -31,46 +136,11 @@ if __name__ == '__main__':
     if args.fields is not None:
         fields = {name: field for name, field in fields.iteritems() if name in args.fields}
 
-    #Get all candidates for all fields.
-    candidates = {field_name: [] for field_name in fields}
-    for document in session.query(Document).options(joinedload(Document.lines))\
-            .filter(Document.is_test == args.test):
-        for field_name, field in fields.iteritems():
-            if getattr(document, field_name) is None:
-                continue
-            doc_candidates = field.get_candidates(document)
-            candidates[field_name].append(doc_candidates)
-
-    #For each field, compute features, scores, and values for candidates.
-    for field_name, field in fields.iteritems():
-        features = field.features_dataframe(candidates[field_name])
-        features.to_csv(path.join(csv_directory, '%s_%s_features.%s.csv'
-                                  % (field_name, dataset, token)), encoding='utf-8')
-
-        col_name = "%s_score" % field_name
-        scores = {}
-        all_candidates = sum(candidates[field_name], [])
-
-        for candidate in all_candidates:
-            value = getattr(candidate.line.document, field_name)
-            row_key = candidate.id
-            scores[row_key] = field.compare(value, candidate.value)
-
-        score_df = pd.DataFrame({col_name: scores}).sort_index()
-        score_df.index.names = features.index.names
-        score_df.to_csv(path.join(csv_directory, '%s_%s_scores.%s.csv'
-                                  % (field_name, dataset, token)), encoding='utf-8')
-
-        col_name = "%s_value" % field_name
-        texts = {}
-        all_candidates = sum(candidates[field_name], [])
-        for candidate in all_candidates:
-            row_key = candidate.id
-            texts[row_key] = candidate.value
-
-        value_df = pd.DataFrame({col_name: texts}).sort_index()
-        value_df.index.names = features.index.names
-        value_df.to_csv(path.join(csv_directory, '%s_%s_value.%s.csv'
-                                  % (field_name, dataset, token)), encoding='utf-8')
+    if args.workers > 1:
+        export_parallel(args.settings, session, fields, args, csv_directory, dataset, token)
+    else:
+        writers = {field_name: open_writer(args.format, csv_directory, field_name, dataset, token)
+                   for field_name in fields}
+        export_documents(session, args.test, fields, writers, args.chunk_size, cache)
 
     print("Candidates exported. Token: %s" % token)
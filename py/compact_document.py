@@ -0,0 +1,202 @@
+"""A compact, read-only in-memory representation of documents.
+
+A CompactDocument keeps the geometry of its boxes and lines in NumPy arrays
+(one per attribute) and their text in a table of unique strings, instead of
+one Python object per line and box. Lines and boxes are exposed through
+small views created on demand, which provide the attributes and methods of
+pdf_classes.Line and pdf_classes.Box that candidate finders and features
+use, so those run unchanged without the ORM.
+"""
+
+from pdf_classes import LayoutIndex
+import numpy as np
+import sys
+
+#The attributes of a document that are copied by from_document, besides field labels.
+DOCUMENT_ATTRIBUTES = ['id', 'filename', 'num_pages', 'is_test']
+
+
+def _column(name):
+    """A read-only property reading one element of an array of the document."""
+    def get(self):
+        return getattr(self._document, name)[self._index].item()
+    return property(get)
+
+
+def _id_column(name):
+    """Like _column, but for ids, which are stored as -1 if missing."""
+    def get(self):
+        value = getattr(self._document, name)[self._index].item()
+        return value if value >= 0 else None
+    return property(get)
+
+
+class BoxView(object):
+    """A box of a CompactDocument."""
+    __slots__ = ['_document', '_index']
+
+    def __init__(self, document, index):
+        self._document = document
+        self._index = index
+
+    id = _id_column('_box_ids')
+    page = _column('_box_page')
+    x0 = _column('_box_x0')
+    y0 = _column('_box_y0')
+    x1 = _column('_box_x1')
+    y1 = _column('_box_y1')
+    vertical = _column('_box_vertical')
+
+    @property
+    def document(self):
+        return self._document
+
+    @property
+    def document_id(self):
+        return self._document.id
+
+    def get_lines(self):
+        """Get the lines in this box, in document order."""
+        return self._document._box_lines(self._index)
+
+    def __eq__(self, other):
+        return isinstance(other, BoxView) and other._document is self._document \
+            and other._index == self._index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._document), self._index))
+
+
+class LineView(object):
+    """A line of a CompactDocument."""
+    __slots__ = ['_document', '_index']
+
+    def __init__(self, document, index):
+        self._document = document
+        self._index = index
+
+    id = _id_column('_line_ids')
+    page = _column('_line_page')
+    x0 = _column('_line_x0')
+    y0 = _column('_line_y0')
+    x1 = _column('_line_x1')
+    y1 = _column('_line_y1')
+    vertical = _column('_line_vertical')
+
+    @property
+    def text(self):
+        document = self._document
+        return document._texts[document._line_text[self._index]]
+
+    @property
+    def box(self):
+        box = self._document._line_box[self._index].item()
+        return BoxView(self._document, box) if box >= 0 else None
+
+    @property
+    def document(self):
+        return self._document
+
+    @property
+    def document_id(self):
+        return self._document.id
+
+    def __eq__(self, other):
+        return isinstance(other, LineView) and other._document is self._document \
+            and other._index == self._index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._document), self._index))
+
+
+class CompactDocument(LayoutIndex):
+    """A read-only document stored as arrays of line and box attributes."""
+    def __init__(self, attributes, boxes, lines):
+        """ Build the arrays.
+
+        :param attributes: A dict of document attributes (such as id, filename
+         and field labels), which are set as attributes of this object.
+        :param boxes: A sequence of (id, page, x0, y0, x1, y1, vertical)
+         tuples, one per box, in document order.
+        :param lines: A sequence of (id, box id, page, x0, y0, x1, y1,
+         vertical, text) tuples, one per line, in document order. The box id
+         is the id of a box in boxes, or None.
+        """
+        self.__dict__.update(attributes)
+
+        boxes = list(boxes)
+        self._box_ids = np.array([box[0] for box in boxes], dtype=np.int64)
+        self._box_page = np.array([box[1] for box in boxes], dtype=np.int32)
+        for i, name in enumerate(['_box_x0', '_box_y0', '_box_x1', '_box_y1']):
+            setattr(self, name, np.array([box[i + 2] for box in boxes], dtype=np.float64))
+        self._box_vertical = np.array([bool(box[6]) for box in boxes], dtype=bool)
+        box_positions = {box[0]: i for i, box in enumerate(boxes)}
+
+        lines = list(lines)
+        texts = {}
+        self._line_ids = np.array([line[0] for line in lines], dtype=np.int64)
+        self._line_box = np.array([box_positions.get(line[1], -1) for line in lines],
+                                  dtype=np.int32)
+        self._line_page = np.array([line[2] for line in lines], dtype=np.int32)
+        for i, name in enumerate(['_line_x0', '_line_y0', '_line_x1', '_line_y1']):
+            setattr(self, name, np.array([line[i + 3] for line in lines], dtype=np.float64))
+        self._line_vertical = np.array([bool(line[7]) for line in lines], dtype=bool)
+        self._line_text = np.array([texts.setdefault(line[8], len(texts)) for line in lines],
+                                   dtype=np.int32)
+        self._texts = [None] * len(texts)
+        for text, i in texts.iteritems():
+            self._texts[i] = text
+
+    @classmethod
+    def from_document(cls, document, attributes=()):
+        """ Copy a Document, whether loaded from the database or not.
+
+        :param document: A pdf_classes.Document.
+        :param attributes: Names of further attributes to copy, such as field labels.
+        :return: A CompactDocument.
+        """
+        names = DOCUMENT_ATTRIBUTES + list(attributes)
+        values = {name: getattr(document, name, None) for name in names}
+        #Boxes that weren't loaded from the database have no ids, so lines are
+        #matched to their boxes by position and the real ids are filled in after.
+        document_boxes = document.get_boxes()
+        positions = {id(box): i for i, box in enumerate(document_boxes)}
+        boxes = [(i, box.page, box.x0, box.y0, box.x1, box.y1, box.vertical)
+                 for i, box in enumerate(document_boxes)]
+        lines = [(getattr(line, 'id', None) or -1, positions.get(id(line.box)),
+                  line.page, line.x0, line.y0, line.x1, line.y1, line.vertical, line.text)
+                 for line in document.get_lines()]
+        compact = cls(values, boxes, lines)
+        compact._box_ids = np.array([getattr(box, 'id', None) or -1 for box in document_boxes],
+                                    dtype=np.int64)
+        return compact
+
+    def get_lines(self):
+        """Get views of all lines in the document."""
+        return [LineView(self, i) for i in range(len(self._line_ids))]
+
+    def get_boxes(self):
+        """Get views of all boxes in the document."""
+        return [BoxView(self, i) for i in range(len(self._box_ids))]
+
+    def _box_lines(self, box):
+        """Get views of the lines in a box."""
+        try:
+            order, starts = self._box_order
+        except AttributeError:
+            order = np.argsort(self._line_box, kind='mergesort')
+            starts = np.searchsorted(self._line_box[order], np.arange(len(self._box_ids) + 1))
+            self._box_order = order, starts
+        return [LineView(self, i) for i in order[starts[box]:starts[box + 1]].tolist()]
+
+    def nbytes(self):
+        """Estimate the memory used by the lines, boxes and text of this document."""
+        arrays = [value for value in self.__dict__.values() if isinstance(value, np.ndarray)]
+        return sum(array.nbytes for array in arrays) + sys.getsizeof(self._texts) + \
+            sum(sys.getsizeof(text) for text in self._texts)
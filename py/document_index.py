@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class DocumentIndex(object):
+    """Row offsets of each document's candidates in data sorted by document.
+
+    Looking up a document's rows is a dictionary lookup giving a slice, so
+    per-document access to a large DataFrame needs no index searches.
+    """
+    def __init__(self, document_ids):
+        """Compute the offsets.
+
+        :param document_ids: The document id of each row, in sorted order.
+        """
+        document_ids = np.asarray(document_ids)
+        if len(document_ids) > 1 and (document_ids[1:] < document_ids[:-1]).any():
+            raise ValueError("Rows must be sorted by document.")
+        documents, starts, counts = np.unique(document_ids, return_index=True,
+                                              return_counts=True)
+        self.documents = documents
+        self.starts = starts
+        self.ends = starts + counts
+        self._positions = {document: i for i, document in enumerate(documents.tolist())}
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build an index for a DataFrame or Series indexed by candidate id."""
+        if len(frame) == 0:
+            return cls([])
+        return cls(frame.index.get_level_values('document'))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, document_id):
+        return document_id in self._positions
+
+    def rows(self, document_id):
+        """Get a slice of the rows belonging to a document (empty if it has none)."""
+        try:
+            i = self._positions[document_id]
+        except KeyError:
+            return slice(0, 0)
+        return slice(self.starts[i], self.ends[i])
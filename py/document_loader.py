@@ -0,0 +1,178 @@
+"""Load documents from the database in bounded chunks.
+
+Documents can be loaded either as ORM objects (document_query and
+iter_document_chunks) or, much more cheaply, as CompactDocuments built
+directly from three Core queries for the documents, their boxes and their
+lines (load_compact_documents and iter_compact_chunks).
+
+Documents whose extraction is still in progress (see
+extract.extract_pdf_checkpointed) are never loaded.
+"""
+
+from pdf_classes import Document, Box, Line
+from compact_document import CompactDocument
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, class_mapper
+import collections
+
+
+def document_query(session, is_test=None, first_id=None, last_id=None):
+    """ Get a query for documents with their lines eagerly loaded.
+
+    :param session: A SQLAlchemy session.
+    :param is_test: If not None, only select documents in (or out of) the test set.
+    :param first_id: If not None, the smallest document id to select.
+    :param last_id: If not None, the largest document id to select.
+    :return: A SQLAlchemy query.
+    """
+    query = session.query(Document).options(joinedload(Document.lines))\
+        .filter(Document.extraction_complete == True)
+    if is_test is not None:
+        query = query.filter(Document.is_test == is_test)
+    if first_id is not None:
+        query = query.filter(Document.id >= first_id)
+    if last_id is not None:
+        query = query.filter(Document.id <= last_id)
+    return query
+
+
+def id_shards(session, is_test, count):
+    """ Split the ids of the selected documents into contiguous ranges.
+
+    :param session: A SQLAlchemy session.
+    :param is_test: If not None, only consider documents in (or out of) the test set.
+    :param count: The number of ranges to split the ids into.
+    :return: A list of (first id, last id) tuples in increasing order. There may
+     be fewer than count of them if there are few documents.
+    """
+    query = session.query(Document.id).filter(Document.extraction_complete == True)
+    if is_test is not None:
+        query = query.filter(Document.is_test == is_test)
+    ids = [row[0] for row in query.order_by(Document.id)]
+    size = -(-len(ids) // count)
+    return [(ids[start], ids[min(start + size, len(ids)) - 1])
+            for start in range(0, len(ids), size)] if ids else []
+
+
+def iter_document_chunks(session, query, chunk_size=None):
+    """ Iterate over the results of a document query in chunks, in order of id.
+
+    Chunks are paged by id rather than by offset, so each page is an index
+    range scan. Each chunk is expunged from the session before the next one
+    is loaded, so memory use is bounded by the chunk size.
+    :param session: The session the query belongs to.
+    :param query: A query for Document objects.
+    :param chunk_size: The number of documents per chunk, or None to load
+     all documents in a single chunk.
+    :return: Generator of lists of documents.
+    """
+    query = query.order_by(Document.id)
+    if chunk_size is None:
+        yield query.all()
+        return
+
+    last_id = None
+    while True:
+        page = query if last_id is None else query.filter(Document.id > last_id)
+        chunk = page.limit(chunk_size).all()
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        yield chunk
+        session.expunge_all()
+
+
+def _conditions(table, is_test, first_id, last_id, where=None):
+    """Get conditions selecting extracted documents in the test set and an id range."""
+    conditions = [table.c.extraction_complete == True]
+    if where is not None:
+        conditions.append(where)
+    if is_test is not None:
+        conditions.append(table.c.is_test == is_test)
+    if first_id is not None:
+        conditions.append(table.c.id >= first_id)
+    if last_id is not None:
+        conditions.append(table.c.id <= last_id)
+    return conditions
+
+
+def _where(query, conditions):
+    for condition in conditions:
+        query = query.where(condition)
+    return query
+
+
+def load_compact_documents(session, is_test=None, first_id=None, last_id=None,
+                           limit=None, layout=True, where=None):
+    """ Load documents as CompactDocuments, without creating ORM objects.
+
+    The documents, their boxes and their lines are each fetched with a single
+    query, whatever the number of documents.
+    :param session: A SQLAlchemy session.
+    :param is_test: If not None, only select documents in (or out of) the test set.
+    :param first_id: If not None, the smallest document id to select.
+    :param last_id: If not None, the largest document id to select.
+    :param limit: If not None, the maximum number of documents to load.
+    :param layout: If False, don't load boxes and lines, only document attributes
+     (such as field labels).
+    :param where: If not None, a further condition on the document table.
+    :return: A list of CompactDocuments in order of id.
+    """
+    document_table, box_table, line_table = [class_mapper(cls).local_table
+                                             for cls in (Document, Box, Line)]
+    query = _where(select([document_table]), _conditions(document_table, is_test,
+                                                         first_id, last_id, where))
+    query = query.order_by(document_table.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = session.execute(query).fetchall()
+    if not rows:
+        return []
+
+    boxes = collections.defaultdict(list)
+    lines = collections.defaultdict(list)
+    if layout:
+        #Select boxes and lines by a subquery rather than a list of ids, which
+        #might exceed the database's limit on parameters.
+        ids = _where(select([document_table.c.id]),
+                     _conditions(document_table, is_test, rows[0].id, rows[-1].id, where))
+        b, l = box_table.c, line_table.c
+        query = select([b.document_id, b.id, b.page, b.x0, b.y0, b.x1, b.y1, b.vertical])\
+            .where(b.document_id.in_(ids)).order_by(b.id)
+        for row in session.execute(query):
+            boxes[row[0]].append(tuple(row[1:]))
+        query = select([l.document_id, l.id, l.box_id, l.page, l.x0, l.y0, l.x1, l.y1,
+                        l.vertical, l.text]).where(l.document_id.in_(ids)).order_by(l.id)
+        for row in session.execute(query):
+            lines[row[0]].append(tuple(row[1:]))
+
+    return [CompactDocument(dict(zip(row.keys(), row)), boxes[row.id], lines[row.id])
+            for row in rows]
+
+
+def iter_compact_chunks(session, is_test=None, chunk_size=None, first_id=None,
+                        last_id=None, layout=True, where=None):
+    """ Iterate over CompactDocuments in chunks, in order of id.
+
+    :param session: A SQLAlchemy session.
+    :param is_test: If not None, only select documents in (or out of) the test set.
+    :param chunk_size: The number of documents per chunk, or None to load
+     all documents in a single chunk.
+    :param first_id: If not None, the smallest document id to select.
+    :param last_id: If not None, the largest document id to select.
+    :param layout: If False, don't load boxes and lines.
+    :param where: If not None, a further condition on the document table.
+    :return: Generator of lists of CompactDocuments.
+    """
+    if chunk_size is None:
+        yield load_compact_documents(session, is_test, first_id, last_id, layout=layout,
+                                     where=where)
+        return
+
+    while True:
+        chunk = load_compact_documents(session, is_test, first_id, last_id,
+                                       chunk_size, layout, where)
+        if not chunk:
+            return
+        first_id = chunk[-1].id + 1
+        yield chunk
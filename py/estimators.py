@@ -4,6 +4,40 @@ from sklearn.base import BaseEstimator
 import importlib
 
 
+def best_values(scores, values):
+    """ Find the value of the highest-scoring candidate in each document.
+
+    This is done in one pass by sorting on (document, -score) and taking the
+    first row for each document. The sort is stable, so ties go to the first
+    candidate in index order, as with idxmax.
+    :param scores: A Series of scores indexed by candidate id, sorted by index.
+    :param values: A Series of candidate values indexed by candidate id.
+    :return: A dict of values keyed by document id. Documents without
+     candidates are omitted.
+    """
+    if len(scores) == 0:
+        return {}
+    if not values.index.equals(scores.index):
+        values = values.reindex(scores.index)
+    documents = np.asarray(scores.index.get_level_values('document'))
+    score_values = np.asarray(scores.values, dtype=float)
+    order = np.lexsort((-score_values, documents))
+    sorted_documents = documents[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_documents[1:] != sorted_documents[:-1]
+    best = order[first]
+    best_values = np.asarray(values.values, dtype=object)[best]
+    # A document whose scores are all missing has no best candidate.
+    best_values[np.isnan(score_values[best])] = None
+    return dict(zip(sorted_documents[first].tolist(), best_values))
+
+
+def _concat(frames):
+    """Concatenate the non-empty frames or series of some documents."""
+    frames = [frame for frame in frames if len(frame) > 0]
+    return pd.concat(frames) if frames else pd.DataFrame()
+
+
 class ModelWrapper(BaseEstimator):
     """ Wraper class for sklearn regressors.
 
@@ -14,7 +48,7 @@ class ModelWrapper(BaseEstimator):
 
     def __init__(self, field, threshold=1,
                  model_module="", model_class="", model_params={},
-                 use_probability=False):
+                 use_probability=False, data=None):
         """Set the field, threshold and model.
 
 
@@ -23,6 +57,9 @@ class ModelWrapper(BaseEstimator):
         :param model_module: The name of the module in which the regressor is defined.
         :param model_class: The classname of the regressor.
         :param model_params: A dictionary of model parameters.
+        :param use_probability: Whether to score candidates with predict_proba.
+        :param data: A CandidateData object. If given, X is an array of
+         positions of documents in the data rather than a list of documents.
         :return: None
         """
         self.field = field
@@ -32,6 +69,7 @@ class ModelWrapper(BaseEstimator):
         self.model_module = model_module
         self.model_params = model_params
         self._use_probability = use_probability
+        self.data = data
 
 
     def get_features(self, X):
@@ -40,6 +78,9 @@ class ModelWrapper(BaseEstimator):
         :param X: A list of documents.
         :return: A pandas DataFrame of features.
         """
+        data = self._shared_data()
+        if data is not None:
+            return data.take(X)[0]
 
         features = []
         for document in X:
@@ -48,8 +89,7 @@ class ModelWrapper(BaseEstimator):
             except (KeyError, AttributeError):
                 self._get_data(document)
                 features.append(document.features[self.field.name])
-        result = pd.concat([f for f in features if len(f) > 0]).sort_index()
-        return result
+        return _concat(features).sort_index()
 
     def get_scores(self, X):
         """ Get match scores for all candidates in a list of documents.
@@ -57,6 +97,9 @@ class ModelWrapper(BaseEstimator):
         :param X: A list of documents.
         :return: A pandas DataFrame of scores.
         """
+        data = self._shared_data()
+        if data is not None:
+            return data.take(X)[1]
         scores = []
         for document in X:
             try:
@@ -64,7 +107,7 @@ class ModelWrapper(BaseEstimator):
             except (KeyError, AttributeError):
                 self._get_data(document)
                 scores.append(document.scores[self.field.name])
-        return pd.concat([s for s in scores if len(s) > 0])
+        return _concat(scores)
 
     def get_values(self, X):
         """ Get the formatted values for the candidates in a document.
@@ -72,6 +115,9 @@ class ModelWrapper(BaseEstimator):
         :param X: A list of documents.
         :return: A pandas DataFrame of values.
         """
+        data = self._shared_data()
+        if data is not None:
+            return data.take(X)[2]
         values = []
         for document in X:
             try:
@@ -80,7 +126,14 @@ class ModelWrapper(BaseEstimator):
                 self._get_data(document)
                 values.append(document.values[self.field.name])
 
-        return pd.concat([f for f in values if len(f) > 0])
+        return _concat(values)
+
+    def _shared_data(self):
+        """Get the precomputed CandidateData, if any.
+
+        Models pickled before it was added have no data attribute.
+        """
+        return getattr(self, 'data', None)
 
     def _get_data(self, document):
         """ Get all candidates for a document and store important data.
@@ -100,7 +153,8 @@ class ModelWrapper(BaseEstimator):
 
         scores = {}
         for candidate in candidates:
-            value = getattr(candidate.line.document, field_name)
+            #Documents being predicted may have no label.
+            value = getattr(candidate.line.document, field_name, None)
             row_key = candidate.id
             try:
                 scores[row_key] = field.compare(value, candidate.value)
@@ -119,9 +173,9 @@ class ModelWrapper(BaseEstimator):
         values_series.index = features.index
 
         try:
-            document.value[field_name] = values_series.sort_index()
+            document.values[field_name] = values_series.sort_index()
         except AttributeError:
-            document.value = {field_name: values_series}
+            document.values = {field_name: values_series}
 
     def fit(self, X, y):
         """Load, initialize, and fit the wrapped estimator"""
@@ -133,23 +187,21 @@ class ModelWrapper(BaseEstimator):
     def predict(self, X):
         """Predict candidate scores and guess the highest-scoring one."""
         features = self.get_features(X)
-        method = self._model.predict_proba if self._use_probability else self.model_.predict
-        pred_scores = method(features)
+        if len(features) == 0:
+            return np.array([None] * len(X))
+        if self._use_probability:
+            #The probability of the positive class.
+            pred_scores = self.model_.predict_proba(features)[:, 1]
+        else:
+            pred_scores = self.model_.predict(features)
         pred_scores = pd.Series(pred_scores, index=features.index)
-        y = []
-        value = self.get_values(X)
-
-        for document in X:
-            try:
-                doc_scores = pred_scores.xs(document.id, level='document').sort_index()
-                doc_value = value.xs(document.id, level='document').sort_index()
-                index = doc_scores.idxmax()
-                y.append(doc_value[index])
-            except KeyError as e:
-                y.append(None)
-                pass
-
-        return np.array(y)
+        best = best_values(pred_scores, self.get_values(X))
+        data = self._shared_data()
+        if data is not None:
+            document_ids = data.document_ids[np.asarray(X, dtype=int)].tolist()
+        else:
+            document_ids = [document.id for document in X]
+        return np.array([best.get(document_id) for document_id in document_ids])
 
     def score(self, X, y):
         """Compute an accuracy score for predictions.
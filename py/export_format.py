@@ -0,0 +1,341 @@
+"""Read and write exported candidate data in several file formats.
+
+The csv format writes separate features, scores and values files, as
+candidate_export.py always has. The other formats write one typed, columnar
+file per field and dataset, holding the document, finder and num index
+columns, one column per feature, and the score and value columns:
+
+-   parquet - a Parquet file (requires pyarrow).
+-   feather - an uncompressed Feather file (requires pyarrow).
+-   npy - a directory of .npy files: one two-dimensional array of all the
+    features, and one file per index, score and value column. Values are
+    pickled; everything else is memory-mapped on load, and the loaded
+    features and scores are views of the mapped files rather than copies.
+
+Parquet and Feather files are converted to pandas on load, which copies
+them into memory.
+"""
+
+import abc
+import numpy as np
+import pandas as pd
+import os
+import shutil
+
+INDEX_NAMES = ['document', 'finder', 'num']
+
+try:
+    _text = unicode
+except NameError:
+    _text = str
+
+
+def _score_column(field_name):
+    return "%s_score" % field_name
+
+
+def _value_column(field_name):
+    return "%s_value" % field_name
+
+
+class ExportWriter(object):
+    """Base class for writers of exported candidate data.
+
+    Data may be written in several chunks, which are appended in order.
+    """
+    extension = None
+
+    def __init__(self, directory, field_name, dataset, token):
+        self.field_name = field_name
+        self.path = os.path.join(directory, '%s_%s.%s.%s'
+                                 % (field_name, dataset, token, self.extension))
+
+    def _combine(self, features, scores, values):
+        """ Join a chunk into a single frame with the index as columns.
+
+        The dtypes of feature arrays depend on their values (a feature may be
+        all integers in one chunk and not in the next), so features and scores
+        are stored as float64 and values as text, whatever the chunk holds.
+        """
+        if len(scores) == 0:
+            return pd.DataFrame(columns=INDEX_NAMES + list(features.columns) +
+                                list(scores.columns) + list(values.columns))
+        frame = features.join([scores, values], how='outer') if len(features.columns) \
+            else scores.join(values, how='outer')
+        for column in list(features.columns) + list(scores.columns):
+            frame[column] = frame[column].astype(np.float64)
+        for column in values.columns:
+            frame[column] = pd.Series([None if pd.isnull(value) else _text(value)
+                                       for value in frame[column]],
+                                      index=frame.index, dtype=object)
+        frame.index.names = INDEX_NAMES
+        return frame.reset_index()
+
+    @abc.abstractmethod
+    def write(self, features, scores, values):
+        """ Append a chunk of candidate data.
+
+        :param features: A DataFrame of features indexed by candidate id.
+        :param scores: A DataFrame with a single column of scores.
+        :param values: A DataFrame with a single column of values.
+        """
+        pass
+
+    def close(self):
+        """Finish writing."""
+        pass
+
+
+class CsvWriter(ExportWriter):
+    """Write features, scores and values to three UTF-8 CSV files."""
+    extension = 'csv'
+
+    def __init__(self, directory, field_name, dataset, token):
+        ExportWriter.__init__(self, directory, field_name, dataset, token)
+        self.paths = [os.path.join(directory, '%s_%s_%s.%s.csv'
+                                   % (field_name, dataset, kind, token))
+                      for kind in ('features', 'scores', 'value')]
+        self._started = [False] * len(self.paths)
+        self._empty = [None] * len(self.paths)
+
+    def write(self, features, scores, values):
+        #As in _combine, so parts written separately are read back the same.
+        features, scores = features.astype(np.float64), scores.astype(np.float64)
+        for i, frame in enumerate((features, scores, values)):
+            if len(frame) == 0:
+                # Empty chunks may lack columns, so don't let them set the header.
+                self._empty[i] = frame
+                continue
+            frame.to_csv(self.paths[i], encoding='utf-8',
+                         mode='a' if self._started[i] else 'w',
+                         header=not self._started[i])
+            self._started[i] = True
+
+    def close(self):
+        for path, started, empty in zip(self.paths, self._started, self._empty):
+            if not started and empty is not None:
+                empty.to_csv(path, encoding='utf-8')
+
+
+class ParquetWriter(ExportWriter):
+    """Write a single Parquet file, one row group per chunk."""
+    extension = 'parquet'
+
+    def __init__(self, directory, field_name, dataset, token):
+        ExportWriter.__init__(self, directory, field_name, dataset, token)
+        self._writer = None
+        self._empty = None
+
+    def write(self, features, scores, values):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        frame = self._combine(features, scores, values)
+        if len(frame) == 0:
+            # Empty chunks may lack columns, so don't let them set the schema.
+            self._empty = frame
+            return
+        if self._writer is None:
+            #A chunk whose values are all missing mustn't make the value column null.
+            schema = pa.Table.from_pandas(frame, preserve_index=False).schema
+            value_column = _value_column(self.field_name)
+            schema = schema.set(schema.get_field_index(value_column),
+                                pa.field(value_column, pa.string()))
+            self._writer = pq.ParquetWriter(self.path, schema)
+        table = pa.Table.from_pandas(frame, schema=self._writer.schema,
+                                     preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._writer is not None:
+            self._writer.close()
+        elif self._empty is not None:
+            pq.write_table(pa.Table.from_pandas(self._empty, preserve_index=False),
+                           self.path)
+
+
+class BufferedWriter(ExportWriter):
+    """Collect all chunks and write them when closed."""
+    def __init__(self, directory, field_name, dataset, token):
+        ExportWriter.__init__(self, directory, field_name, dataset, token)
+        self._chunks = []
+
+    def write(self, features, scores, values):
+        self._chunks.append(self._combine(features, scores, values))
+
+    def close(self):
+        chunks = [chunk for chunk in self._chunks if len(chunk)] or self._chunks[:1]
+        frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        self._write_frame(frame)
+        self._chunks = []
+
+    @abc.abstractmethod
+    def _write_frame(self, frame):
+        """Write all of the data, as a frame with the index as columns."""
+        pass
+
+
+class FeatherWriter(BufferedWriter):
+    """Write a single uncompressed Feather file, which can be memory-mapped."""
+    extension = 'feather'
+
+    def _write_frame(self, frame):
+        import pyarrow.feather as feather
+        feather.write_feather(frame, self.path, compression='uncompressed')
+
+
+class NpyWriter(BufferedWriter):
+    """Write a directory of .npy files, with the features in a single array.
+
+    The names of the features, in the order of the array's columns, are
+    written to columns.txt.
+    """
+    extension = 'npy'
+
+    def _write_frame(self, frame):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        score_column, value_column = _score_column(self.field_name), _value_column(self.field_name)
+        names = [c for c in frame.columns if c not in INDEX_NAMES + [score_column, value_column]]
+        frame = frame.reindex(columns=INDEX_NAMES + names + [score_column, value_column])
+        features = np.asarray(frame[names], dtype=np.float64).reshape(len(frame), len(names))
+        np.save(os.path.join(self.path, 'features.npy'), features)
+        for column in INDEX_NAMES + [score_column, value_column]:
+            values = np.asarray(frame[column])
+            np.save(os.path.join(self.path, '%s.npy' % column), values,
+                    allow_pickle=values.dtype == object)
+        with open(os.path.join(self.path, 'columns.txt'), 'w') as f:
+            f.write("\n".join(names))
+
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter,
+           'feather': FeatherWriter, 'npy': NpyWriter}
+FORMATS = sorted(WRITERS)
+
+
+def open_writer(fmt, directory, field_name, dataset, token):
+    """Get a writer for exported candidate data in the given format."""
+    return WRITERS[fmt](directory, field_name, dataset, token)
+
+
+def _split(frame, field_name):
+    """Split a combined frame into features, scores and values."""
+    frame = frame.set_index(INDEX_NAMES)
+    score_column, value_column = _score_column(field_name), _value_column(field_name)
+    features = frame[[c for c in frame.columns if c not in (score_column, value_column)]]
+    return features, frame[score_column], frame[value_column]
+
+
+def _load_column(path):
+    """Load a column saved by NpyWriter, memory-mapping it unless it holds objects."""
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        return np.load(path, allow_pickle=True)
+
+
+def _read_npy(path, field_name):
+    """ Read data written by NpyWriter without copying the mapped arrays.
+
+    The index is built from the index columns, but the features and scores
+    are views of the memory-mapped files.
+    """
+    def load(name):
+        return _load_column(os.path.join(path, '%s.npy' % name))
+    with open(os.path.join(path, 'columns.txt')) as f:
+        names = [name for name in f.read().split("\n") if name]
+    index = pd.MultiIndex.from_arrays([load(name) for name in INDEX_NAMES], names=INDEX_NAMES)
+    score_column, value_column = _score_column(field_name), _value_column(field_name)
+    features = pd.DataFrame(load('features'), index=index, columns=names, copy=False)
+    scores = pd.Series(load(score_column), index=index, name=score_column, copy=False)
+    values = pd.Series(load(value_column), index=index, name=value_column)
+    return features, scores, values
+
+
+def read_export(fmt, directory, field_name, dataset, token):
+    """ Read exported candidate data.
+
+    :param fmt: The format the data was written in.
+    :param directory: The directory containing the exported files.
+    :param field_name: The name of the field.
+    :param dataset: Either "training" or "test".
+    :param token: The token returned by candidate_export.py.
+    :return: A 3-tuple of a features DataFrame, a scores Series and a values
+     Series, all indexed by candidate id. With the npy format, the features and
+     scores are backed by read-only memory-mapped arrays.
+    """
+    writer = WRITERS[fmt](directory, field_name, dataset, token)
+    if fmt == 'csv':
+        features_path, scores_path, values_path = writer.paths
+        features = pd.read_csv(features_path, index_col=list(range(3)))
+        scores = pd.read_csv(scores_path, index_col=list(range(3)))[_score_column(field_name)]
+        values = pd.read_csv(values_path, index_col=list(range(3)))[_value_column(field_name)]
+        return features, scores, values
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        frame = pq.read_table(writer.path, memory_map=True).to_pandas()
+    elif fmt == 'feather':
+        import pyarrow.feather as feather
+        frame = feather.read_table(writer.path, memory_map=True).to_pandas()
+    else:
+        return _read_npy(writer.path, field_name)
+    return _split(frame, field_name)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _merge_csv(parts, merged):
+    """Concatenate CSV parts, keeping the header of the first part with rows."""
+    for i, path in enumerate(merged.paths):
+        header = None
+        started = False
+        with open(path, 'wb') as out:
+            for part in parts:
+                with open(part.paths[i], 'rb') as f:
+                    first = f.readline()
+                    second = f.readline()
+                    if not second:
+                        #A part without rows may lack columns; only use its header if
+                        #no part has rows.
+                        header = header or first
+                        continue
+                    if not started:
+                        out.write(first)
+                        started = True
+                    out.write(second)
+                    shutil.copyfileobj(f, out)
+            if not started and header is not None:
+                out.write(header)
+
+
+def merge_parts(fmt, directory, field_name, dataset, part_tokens, token):
+    """ Concatenate exports written in parts into a single export, then remove the parts.
+
+    :param fmt: The format the parts were written in.
+    :param directory: The directory containing the exported files.
+    :param field_name: The name of the field.
+    :param dataset: Either "training" or "test".
+    :param part_tokens: The tokens of the parts, in the order to concatenate them.
+    :param token: The token to write the merged export under.
+    """
+    parts = [WRITERS[fmt](directory, field_name, dataset, part_token)
+             for part_token in part_tokens]
+    merged = open_writer(fmt, directory, field_name, dataset, token)
+    if fmt == 'csv':
+        #Copy the text directly, so values are not reformatted by a round trip.
+        _merge_csv(parts, merged)
+    else:
+        for part_token in part_tokens:
+            features, scores, values = read_export(fmt, directory, field_name,
+                                                   dataset, part_token)
+            merged.write(features, scores.to_frame(), values.to_frame())
+        merged.close()
+    for part in parts:
+        for path in getattr(part, 'paths', [part.path]):
+            _remove(path)
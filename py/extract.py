@@ -14,61 +14,338 @@ import re
 import os
 
 
-def extract_pdf_data(fp, test_proportion=0, labels={}, session=None):
-    """ Get PDF data from a file.
+#The LAParams of the layout profiles, which the settings can override. The fast
+#profile sets boxes_flow to None, so boxes are ordered by position instead of
+#being grouped into a hierarchy, which takes time quadratic in the number of
+#boxes; text in figures isn't analyzed and vertical text isn't detected.
+LAYOUT_PROFILES = {'full': {},
+                   'fast': {'boxes_flow': None, 'all_texts': False, 'detect_vertical': False}}
 
-    TODO why is this a standalone function?
+
+def layout_device(rsrcmgr, layout=None):
+    """ Make the PDFMiner device that analyzes page layouts.
+
+    :param rsrcmgr: A PDFResourceManager.
+    :param layout: A dict with the layout profile and LAParams keyword
+     arguments, as returned by Settings.layout, or None for the full profile
+     with default parameters.
+    :return: A PDFPageAggregator.
+    """
+    layout = layout or {}
+    params = dict(LAYOUT_PROFILES[layout.get('profile', 'full')], **layout.get('laparams', {}))
+    return PDFPageAggregator(rsrcmgr, laparams=LAParams(**params))
+
+
+def iter_pages(fp, start_page=0, end_page=None, layout=None):
+    """ Run PDFMiner layout analysis on a file, one page at a time.
+
+    The layout is returned as plain tuples so that it can be passed between
+    processes and saved without going through any ORM objects.
     :param fp: A file pointer to the PDF.
-    :param labels: Correct metadata labels for this document.
-    :param session: A SQLAlchemy session, for saving.
-    :return: A Document object.
+    :param start_page: The number of the first page to analyze. Earlier pages
+     are skipped without layout analysis.
+    :param end_page: If not None, stop before the page with this number.
+    :param layout: The layout profile and parameters (see layout_device).
+    :return: Generator of 2-tuples of page numbers and lists of boxes.
+     Each box is a tuple (x0, y0, x1, y1, vertical, lines) and each line is
+     a tuple (x0, y0, x1, y1, vertical, text).
     """
 
-    filename = os.path.split(fp.name)[-1]
     parser = PDFParser(fp)
     pdf = PDFDocument(parser)
     parser.set_document(pdf)
 
     rsrcmgr = PDFResourceManager()
-    laparams = LAParams()
-    device = PDFPageAggregator(rsrcmgr, laparams=laparams)
+    device = layout_device(rsrcmgr, layout)
     interpreter = PDFPageInterpreter(rsrcmgr, device)
 
-    pages = PDFPage.create_pages(pdf)
+    for i, page in enumerate(PDFPage.create_pages(pdf)):
+        if end_page is not None and i >= end_page:
+            break
+        if i < start_page:
+            continue
+        interpreter.process_page(page)
+        layout = device.get_result()
+        boxes = []
+        for b in layout:
+            if not isinstance(b, LTTextBox):
+                continue
+            lines = []
+            for l in b:
+                if not isinstance(l, LTTextLine):
+                    continue
+                text = re.sub(r'\(cid:\d+\)', "", l.get_text()).strip()
+                if len(text) > 0:
+                    lines.append((l.bbox[0], l.bbox[1], l.bbox[2], l.bbox[3],
+                                  isinstance(l, LTTextLineVertical), text))
+            boxes.append((b.bbox[0], b.bbox[1], b.bbox[2], b.bbox[3],
+                          isinstance(b, LTTextBoxVertical), lines))
+        yield i, boxes
+
+
+def count_pages(fp):
+    """Count the pages of a PDF without analyzing their layout."""
+    parser = PDFParser(fp)
+    pdf = PDFDocument(parser)
+    parser.set_document(pdf)
+    return sum(1 for _ in PDFPage.create_pages(pdf))
+
+
+def new_document(filename, test_proportion=0, labels={}, attributes=None):
+    """ Create an empty Document with its labels set.
+
+    :param filename: The name of the PDF file.
+    :param test_proportion: The probability of assigning the document to the test set.
+    :param labels: Correct metadata labels for this document.
+    :param attributes: Other document attributes to set, such as file
+     metadata. Setting is_test here overrides the random assignment.
+    :return: A Document object.
+    """
     document = Document(filename=filename, is_test=random() < test_proportion)
     for key in labels:
         setattr(document, key, labels[key])
+    for key, value in (attributes or {}).iteritems():
+        setattr(document, key, value)
+    return document
+
+
+def add_page(document, page, boxes, session=None):
+    """ Add the boxes and lines of one page to a document.
+
+    :param document: A Document object.
+    :param page: The page number.
+    :param boxes: A list of boxes, as generated by iter_pages.
+    :param session: A SQLAlchemy session, for saving.
+    """
+    for x0, y0, x1, y1, vertical, lines in boxes:
+        box = Box(document=document, page=page,
+                  x0=x0, y0=y0, x1=x1, y1=y1, vertical=vertical)
+        if session:
+            session.add(box)
+        for lx0, ly0, lx1, ly1, lvertical, text in lines:
+            line = Line(box=box, document=document,
+                        x0=lx0, y0=ly0, x1=lx1, y1=ly1,
+                        text=text, vertical=lvertical, page=page)
+            if session:
+                session.add(line)
+
+
+def save_layout(filename, pages, test_proportion=0, labels={}, session=None,
+                bulk=False, attributes=None):
+    """ Build a Document from an already extracted layout.
+
+    :param filename: The name of the PDF file.
+    :param pages: A list of (page number, boxes) tuples, as generated by iter_pages.
+    :param test_proportion: The probability of assigning the document to the test set.
+    :param labels: Correct metadata labels for this document.
+    :param session: A SQLAlchemy session, for saving.
+    :param bulk: If True, write boxes and lines with batched Core inserts
+     instead of ORM objects (see save_layout_bulk).
+    :param attributes: Other document attributes to set (see new_document).
+    :return: A Document object.
+    """
+    if bulk and session:
+        return save_layout_bulk(filename, pages, test_proportion, labels, session,
+                                attributes)
+
+    document = new_document(filename, test_proportion, labels, attributes)
     if session:
         session.add(document)
 
-    for i, page in enumerate(pages):
-        # TODO: figure out how to get the number of pages directly from pages object
-        document.num_pages = i+1
-        interpreter.process_page(page)
-        layout = device.get_result()
-        boxes = [obj for obj in layout if isinstance(obj, LTTextBox)]
-        for b in boxes:
-            box = Box(document=document, page=i,
-                      x0=b.bbox[0], y0=b.bbox[1],
-                      x1=b.bbox[2], y1=b.bbox[3],
-                      vertical=isinstance(b, LTTextBoxVertical))
-            if session:
-                session.add(box)
-            lines = [obj for obj in b
-                     if isinstance(obj, LTTextLine)]
-            for l in lines:
-                text = re.sub(r'\(cid:\d+\)', "", l.get_text()).strip()
-                if len(text) > 0:
-                    vertical = isinstance(l, LTTextLineVertical)
-                    line = Line(box=box, document=document,
-                                x0=l.bbox[0], y0=l.bbox[1],
-                                x1=l.bbox[2], y1=l.bbox[3],
-                                text=text, vertical=vertical, page=i)
-                    if session:
-                        session.add(line)
+    for i, boxes in pages:
+        document.num_pages = max(document.num_pages, i+1)
+        add_page(document, i, boxes, session)
 
     # do the whole file on one transaction so we can restart
     # easily if necessary
     if session:
         session.commit()
     return document
+
+
+def save_layout_bulk(filename, pages, test_proportion=0, labels={}, session=None,
+                     attributes=None):
+    """ Save an extracted layout with executemany inserts.
+
+    Only the Document goes through the ORM. Boxes and lines are written as
+    plain rows in batches of BULK_BATCH_SIZE. Box ids are read back with a
+    single query per document, relying on autoincrement ids being assigned
+    in insertion order, which holds as long as there is a single writer.
+    The returned Document has no boxes or lines attached in memory.
+    :param filename: The name of the PDF file.
+    :param pages: A list of (page number, boxes) tuples, as generated by iter_pages.
+    :param test_proportion: The probability of assigning the document to the test set.
+    :param labels: Correct metadata labels for this document.
+    :param session: A SQLAlchemy session, for saving.
+    :param attributes: Other document attributes to set (see new_document).
+    :return: A Document object.
+    """
+    document = new_document(filename, test_proportion, labels, attributes)
+    pages = list(pages)
+    if pages:
+        document.num_pages = max(document.num_pages, pages[-1][0] + 1)
+
+    session.add(document)
+    session.flush()
+    insert_pages(session, document.id, pages)
+
+    # do the whole file on one transaction so we can restart
+    # easily if necessary
+    session.commit()
+    return document
+
+
+BULK_BATCH_SIZE = 1000
+
+
+def insert_pages(session, document_id, pages):
+    """ Insert the boxes and lines of some pages of a document, without committing.
+
+    Box ids are read back with a single query over the pages' range.
+    :param session: A SQLAlchemy session.
+    :param document_id: The id of the document.
+    :param pages: A list of (page number, boxes) tuples in order, as generated
+     by iter_pages. The document must have no boxes on these pages yet.
+    """
+    from sqlalchemy import select
+    from sqlalchemy.orm import class_mapper
+    box_table = class_mapper(Box).local_table
+    line_table = class_mapper(Line).local_table
+    if not pages:
+        return
+
+    box_rows = []
+    line_rows = []
+    for i, boxes in pages:
+        for x0, y0, x1, y1, vertical, lines in boxes:
+            box_rows.append((i, x0, y0, x1, y1, vertical))
+            line_rows.append(lines)
+
+    _insert_rows(session, box_table,
+                 [dict(document_id=document_id, page=page, x0=x0, y0=y0,
+                       x1=x1, y1=y1, vertical=vertical)
+                  for page, x0, y0, x1, y1, vertical in box_rows])
+    c = box_table.c
+    box_ids = [row[0] for row in session.execute(
+        select([c.id]).where(c.document_id == document_id)
+        .where(c.page >= pages[0][0]).where(c.page <= pages[-1][0])
+        .order_by(c.id))]
+
+    _insert_rows(session, line_table,
+                 [dict(document_id=document_id, box_id=box_id, page=box[0],
+                       x0=x0, y0=y0, x1=x1, y1=y1, vertical=vertical, text=text)
+                  for box_id, box, lines in zip(box_ids, box_rows, line_rows)
+                  for x0, y0, x1, y1, vertical, text in lines])
+
+
+def _insert_rows(session, table, rows):
+    """Insert a list of row dictionaries with one executemany per batch."""
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        session.execute(table.insert(), rows[start:start + BULK_BATCH_SIZE])
+
+
+def extract_pdf_data(fp, test_proportion=0, labels={}, session=None, bulk=False,
+                     attributes=None, page_cutoff=None, filename=None, layout=None):
+    """ Get PDF data from a file.
+
+    TODO why is this a standalone function?
+    :param fp: A file pointer to the PDF.
+    :param labels: Correct metadata labels for this document.
+    :param session: A SQLAlchemy session, for saving.
+    :param bulk: Whether to save boxes and lines with bulk inserts.
+    :param attributes: Other document attributes to set (see new_document).
+    :param page_cutoff: If not None, only extract this many pages. The number
+     extracted is recorded in pages_done, so the rest can be backfilled later.
+    :param filename: The name of the PDF file, if not that of fp (which may be
+     an in-memory file).
+    :param layout: The layout profile and parameters (see layout_device).
+    :return: A Document object.
+    """
+
+    if filename is None:
+        filename = os.path.split(fp.name)[-1]
+    if page_cutoff is not None:
+        attributes = dict(attributes or {}, **cutoff_attributes(count_pages(fp), page_cutoff))
+    return save_layout(filename, iter_pages(fp, end_page=page_cutoff, layout=layout),
+                       test_proportion, labels, session, bulk, attributes)
+
+
+def cutoff_attributes(num_pages, page_cutoff):
+    """Get the document attributes recording that only some pages were extracted."""
+    return {'num_pages': num_pages, 'pages_done': min(num_pages, page_cutoff)}
+
+
+def extract_pdf_checkpointed(fp, test_proportion=0, labels={}, session=None,
+                             checkpoint_pages=1, attributes=None, document=None,
+                             page_cutoff=None, layout=None):
+    """ Extract a PDF to the database, committing every few pages.
+
+    The document is marked incomplete, and so hidden from candidate export,
+    training and prediction, until its last page has been saved. Progress is
+    recorded in its pages_done column, so an interrupted extraction can be
+    resumed by passing the incomplete document back in.
+    Boxes and lines are saved with bulk inserts.
+    :param fp: A file pointer to the PDF.
+    :param test_proportion: The probability of assigning the document to the test set.
+    :param labels: Correct metadata labels for this document.
+    :param session: A SQLAlchemy session, for saving.
+    :param checkpoint_pages: The number of pages to save in each transaction.
+    :param attributes: Other document attributes to set (see new_document).
+    :param document: An incomplete Document to resume, or None to start a new one.
+    :param page_cutoff: If not None, only extract this many pages (see extract_pdf_data).
+    :param layout: The layout profile and parameters (see layout_device).
+    :return: The Document object.
+    """
+    if document is None:
+        filename = os.path.split(fp.name)[-1]
+        document = new_document(filename, test_proportion, labels, attributes)
+        if page_cutoff is not None:
+            document.num_pages = count_pages(fp)
+        document.pages_done = 0
+        document.extraction_complete = False
+        session.add(document)
+        session.commit()
+
+    batch = []
+    for i, boxes in iter_pages(fp, document.pages_done or 0, page_cutoff, layout):
+        batch.append((i, boxes))
+        if len(batch) == checkpoint_pages:
+            _save_checkpoint(session, document, batch)
+            batch = []
+    _save_checkpoint(session, document, batch)
+
+    document.extraction_complete = True
+    session.commit()
+    return document
+
+
+def _save_checkpoint(session, document, pages):
+    """Save some pages of a document and record them as done in one transaction."""
+    if not pages:
+        return
+    insert_pages(session, document.id, pages)
+    document.pages_done = pages[-1][0] + 1
+    document.num_pages = max(document.num_pages, document.pages_done)
+    session.commit()
+
+
+def extract_layout(path, page_cutoff=None, layout=None):
+    """ Extract the layout of a PDF file in a worker process.
+
+    :param path: The path to the PDF.
+    :param page_cutoff: If not None, only extract this many pages.
+    :param layout: The layout profile and parameters (see layout_device).
+    :return: A 4-tuple of the filename, a list of pages as generated by
+     iter_pages, a dict of further document attributes (see cutoff_attributes),
+     and an error message (None if extraction succeeded).
+    """
+    filename = os.path.split(path)[-1]
+    try:
+        with open(path, "rb") as fp:
+            attributes = {}
+            if page_cutoff is not None:
+                attributes = cutoff_attributes(count_pages(fp), page_cutoff)
+            pages = list(iter_pages(fp, end_page=page_cutoff, layout=layout))
+            return filename, pages, attributes, None
+    except Exception as e:
+        return filename, None, None, str(e)
@@ -1,4 +1,58 @@
 import abc
+import numpy as np
+
+
+class CandidateBatch(object):
+    """A column-oriented view of the candidates of several documents.
+
+    Columns are built the first time they are requested and then cached, so
+    features sharing a column only pay for it once.
+    """
+    _columns = {
+        'x0': lambda c: c.line.x0,
+        'y0': lambda c: c.line.y0,
+        'x1': lambda c: c.line.x1,
+        'y1': lambda c: c.line.y1,
+        'page': lambda c: c.line.page,
+        'box_x0': lambda c: c.line.box.x0,
+        'box_y1': lambda c: c.line.box.y1,
+        'value': lambda c: c.value,
+        'match': lambda c: c.match,
+        'text': lambda c: c.line.text,
+    }
+    _text_columns = {'value', 'match', 'text'}
+
+    def __init__(self, candidates_by_doc):
+        """Collect the candidates.
+
+        :param candidates_by_doc: A list of lists of candidates, one per document.
+        """
+        self.groups = [candidates for candidates in candidates_by_doc if len(candidates)]
+        self.candidates = [candidate for candidates in self.groups
+                           for candidate in candidates]
+        self.ids = [candidate.id for candidate in self.candidates]
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def column(self, name):
+        """ Get an attribute of every candidate as a NumPy array.
+
+        :param name: One of x0, y0, x1, y1 and page (of the candidate's line),
+         box_x0 and box_y1 (of the line's box), value, match or text.
+        :return: An array in the order of self.candidates. Text columns
+         are object arrays of the strings themselves, rather than fixed-width
+         arrays as wide as the longest string.
+        """
+        try:
+            return self._cache[name]
+        except KeyError:
+            getter = self._columns[name]
+            dtype = object if name in self._text_columns else None
+            self._cache[name] = np.array([getter(c) for c in self.candidates], dtype=dtype)
+            return self._cache[name]
+
 
 class Feature:
     """An abstract base class for feature types."""
@@ -14,4 +68,18 @@ class Feature:
         :return: A dictionary of feature values, keyed by candidate ID.
         """
 
-        pass
\ No newline at end of file
+        pass
+
+    def compute_batch(self, batch):
+        """ Compute this feature for a batch of candidates.
+
+        Features that can be computed on whole columns should override this.
+        The default calls compute once per document, so features that
+        compare candidates within a document keep working.
+        :param batch: A CandidateBatch.
+        :return: A NumPy array of feature values, in the order of batch.candidates.
+        """
+        values = {}
+        for candidates in batch.groups:
+            values.update(self.compute(candidates))
+        return np.array([values[cid] for cid in batch.ids])
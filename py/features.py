@@ -1,5 +1,5 @@
 from feature import Feature
-import re
+import numpy as np
 import bisect
 
 class LowerLeftX(Feature):
@@ -7,12 +7,18 @@ class LowerLeftX(Feature):
     def compute(self, candidates):
         return {candidate.id: candidate.line.x0 for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return batch.column('x0')
+
 
 class LowerLeftY(Feature):
     """The y-coordinate of the lower left corner of the candidate's line."""
     def compute(self, candidates):
         return {candidate.id: candidate.line.y0 for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return batch.column('y0')
+
 
 class CharsInString(Feature):
     """The number of characters from a specified string."""
@@ -23,6 +29,10 @@ class CharsInString(Feature):
     def compute(self, candidates):
         return {candidate.id: sum([candidate.value.count(c) for c in self._string]) for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return np.array([sum([value.count(c) for c in self._string])
+                         for value in batch.column('value')], dtype=int)
+
 
 class WordCount(Feature):
     """The number of words in a formatted candidate."""
@@ -35,24 +45,36 @@ class LineHeight(Feature):
     def compute(self, candidates):
         return {candidate.id: candidate.line.y1 - candidate.line.y0 for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return batch.column('y1') - batch.column('y0')
+
 
 class XBox(Feature):
     """The x position of the candidate line relative to its containing box."""
     def compute(self, candidates):
         return {candidate.id: candidate.line.box.x0 - candidate.line.x0 for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return batch.column('box_x0') - batch.column('x0')
+
 
 class YBox(Feature):
     """The y position of the candidate line relative to its containing box."""
     def compute(self, candidates):
         return {candidate.id: candidate.line.y1 - candidate.line.box.y1 for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return batch.column('y1') - batch.column('box_y1')
+
 
 class PageNum(Feature):
     """The page on which a candidate is found."""
     def compute(self, candidates):
         return {candidate.id: candidate.line.page for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return batch.column('page')
+
 
 class AllCapsWordCount(Feature):
     """The number of words in a candidate match text."""
@@ -77,9 +99,8 @@ class InitLowerWordCount(Feature):
 class BoxRank(Feature):
     """The number of boxes above a given line's box on the page."""
     def compute(self, candidates):
-        return {candidate.id: len([b for b in candidate.line.document.get_boxes()
-                                   if b.y1 > candidate.line.box.y1 and
-                                   b.page == candidate.line.page])
+        return {candidate.id: candidate.line.document.box_rank(candidate.line.page,
+                                                               candidate.line.box.y1)
                 for candidate in candidates}
 
 
@@ -124,11 +145,10 @@ class BoxPhrases(Feature):
     def compute(self, candidates):
         result = {candidate.id: {} for candidate in candidates}
         pb = self.field.settings.pattern_builder
+        regex = pb.list_regex(self._phrases)
         for candidate in candidates:
-            pattern = pb.list_pattern(self._phrases)
-
             result[candidate.id] = len([1 for line in candidate.line.box.get_lines()
-                                         if re.search(pattern, line.text) is not None])
+                                         if regex.search(line.text) is not None])
 
         return result
 
@@ -142,18 +162,29 @@ class ContainsString(Feature):
     def compute(self, candidates):
         return {candidate.id: int(self._string in candidate.line.text) for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return np.array([int(self._string in text) for text in batch.column('text')], dtype=int)
+
 
 class Length(Feature):
     """The length of a candidate value."""
     def compute(self, candidates):
         return {candidate.id: len(candidate.value) for candidate in candidates}
 
+    def compute_batch(self, batch):
+        return np.array([len(value) for value in batch.column('value')], dtype=int)
+
 
 class DigitCount(Feature):
     """The number of digits in a candidate's value."""
     def compute(self, candidates):
         return {candidate.id: sum([c.isdigit() for c in candidate.value]) for candidate in candidates}
 
+    def compute_batch(self, batch):
+        #isdigit, as in compute, also counts digits such as superscripts.
+        return np.array([sum([c.isdigit() for c in value]) for value in batch.column('value')],
+                        dtype=int)
+
 
 class AlphaCount(Feature):
     """The number of alphabetic characters in a candidate's value."""
@@ -1,8 +1,11 @@
 import importlib
 import abc
+import copy
 import re
+import numpy as np
 import pandas as pd
-import os
+from feature import CandidateBatch
+from candidate_data import CandidateData
 
 
 class Field(object):
@@ -48,6 +51,19 @@ class Field(object):
         """Return all candidates identified by all of the candidate finders"""
         return sum([finder.get_candidates(document) for finder in self._candidate_finders.values()], [])
 
+    def page_range(self):
+        """ Get the range of pages that any of the field's candidate finders looks at.
+
+        :return: A 2-tuple of the first and last page numbers, where the last
+         is None if there is no limit.
+        """
+        ranges = [finder.page_range() for finder in self._candidate_finders.values()]
+        if not ranges:
+            return 0, None
+        first = min(first for first, last in ranges)
+        lasts = [last for first, last in ranges]
+        return first, None if None in lasts else max(lasts)
+
     def preprocess(self, text):
         """Preprocess a string before looking for a value."""
         return text
@@ -68,46 +84,67 @@ class Field(object):
         """Compare two different values of this field"""
         return float(value1 == value2)
 
-    def doc_features(self, candidates):
-        """Compute all features for a list of candidates."""
-        result = {candidate.id: {} for candidate in candidates}
-        for feature_name, feature in self.features.iteritems():
-            values = feature.compute(candidates)
-            for candidate in candidates:
-                cid = candidate.id
-                result[cid][feature_name] = values[cid]
-        return result
-
-    def features_dataframe(self, candidates_by_doc):
+    def features_dataframe(self, candidates_by_doc, names=None):
         """Compute a dataframe of features for candidates.
-        :candidates_by_doc: A dictionary, whose keys are document ids and whose
-        values are lists of candidates in the corresponding documents.
+        :candidates_by_doc: A list of lists of candidates, one for each document.
+        :names: The names of the features to compute (by default, all of them).
 
+        Features are computed a column at a time on a CandidateBatch, so the
+        values are never gathered in per-candidate dictionaries.
         """
 
-        features = {}
-        for candidates in candidates_by_doc:
-            features.update(self.doc_features(candidates))
+        batch = CandidateBatch(candidates_by_doc)
+        if len(batch) == 0:
+            return pd.DataFrame()
 
-        df = pd.DataFrame(features).transpose()
-        if len(df) > 0:
-            df.index.names = ['document', 'finder', 'num']
-        return df
+        if names is None:
+            names = self.features.keys()
+        columns = {name: self.features[name].compute_batch(batch) for name in names}
+        index = pd.MultiIndex.from_tuples(batch.ids, names=['document', 'finder', 'num'])
+        df = pd.DataFrame(columns, index=index, columns=sorted(columns))
+        # Candidate ids may repeat; keep the last, as a dictionary would.
+        df = df[~df.index.duplicated(keep='last')]
+        return df.sort_index()
 
     def _check_model(self):
+        """ Get the field's model, if it has one, from the model registry.
+
+        The model is only read from disk the first time and after it is retrained.
+        """
         if "model_definition" in self._data:
-            import pickle
-            directory = self.settings.get_directory('pickle')
-            model_file = self._data['model_definition'] + ".pkl"
-            with open(os.path.join(directory, model_file)) as f:
-                self._model = pickle.load(f)
+            from model_registry import load_model
+            self._model = load_model(self.settings.get_directory('pickle'),
+                                     self._data['model_definition'])
 
     def predict(self, document):
+        """ Predict the value of this field for a document.
+
+        :param document: A Document object.
+        :return: The predicted value, or None if there are no candidates. Without
+         a model, the value of the first candidate is used.
+        """
         self._check_model()
+        model = getattr(self, '_model', None)
+        if model is not None:
+            return model.predict([document])[0]
         try:
-            return self._model.predict([document])
-        except AttributeError:
-            try:
-                return self.get_candidates(document)[0].value
-            except IndexError:
-                return None
+            return self.get_candidates(document)[0].value
+        except IndexError:
+            return None
+
+    def predict_documents(self, documents):
+        """ Predict the value of this field for a list of documents at once.
+
+        Candidates are found and features computed for all of the documents
+        together, and the model is called once.
+        :param documents: A list of Document objects.
+        :return: An array of predicted values, one per document.
+        """
+        self._check_model()
+        model = getattr(self, '_model', None)
+        if model is None:
+            return np.array([self.predict(document) for document in documents], dtype=object)
+        #The cached model is shared, so give the data to a copy of it.
+        model = copy.copy(model)
+        model.data = CandidateData.from_documents(model.field, documents)
+        return model.predict(np.arange(len(documents)))
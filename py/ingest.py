@@ -0,0 +1,254 @@
+"""Extract PDFs from the pdf directory into the database.
+
+Ingestion is incremental. The size, modification time and SHA-256 hash of
+each file are recorded on its document. Files whose size and modification
+time match the record are skipped without being opened. Files whose content
+has changed are extracted again, replacing the old document but keeping its
+test set assignment. Documents extracted before these were recorded have
+them filled in, on the assumption that their files haven't changed.
+
+Documents left incomplete by an interrupted checkpointed extraction are
+resumed if their files are unchanged and checkpoints are used again, and
+otherwise extracted again from the start.
+
+With a page cutoff, only the first pages of each file are extracted, and the
+number extracted is recorded in pages_done. The remaining pages can be added
+later by backfill.
+"""
+
+from extract import extract_pdf_data, extract_pdf_checkpointed, extract_layout, save_layout
+from extract import iter_pages, insert_pages
+from functools import partial
+from pdf_classes import Document, Box, Line
+from multiprocessing import Pool
+import hashlib
+import os
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_info(path):
+    """ Get the metadata recorded for a PDF file.
+
+    :param path: The path to the file.
+    :return: A dict with the file_size, file_mtime and file_hash of the file.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return {'file_size': stat.st_size, 'file_mtime': stat.st_mtime,
+            'file_hash': digest.hexdigest()}
+
+
+def _tables():
+    from sqlalchemy.orm import class_mapper
+    return [class_mapper(cls).local_table for cls in (Document, Box, Line)]
+
+
+def pending_files(settings, session):
+    """ Work out which PDFs need to be extracted to the database.
+
+    Recorded metadata of documents whose files are unchanged apart from their
+    modification time, or that have no metadata yet, is updated and committed.
+    Files that can't be read are reported and skipped.
+    :param settings: A Settings object.
+    :param session: A SQLAlchemy session.
+    :return: A list of (filename, document id, is_test, pages done, info) tuples,
+     one per file to extract. The document id is that of the existing document,
+     and is_test its test set assignment, or both are None for a new file.
+     Pages done is the number of pages saved if the existing document is
+     incomplete and can be resumed, and None otherwise. Info is the file_info
+     of the file if it was computed here, and None otherwise.
+    """
+    document_table = _tables()[0]
+    d = document_table.c
+    query = session.query(d.filename, d.id, d.is_test, d.file_size, d.file_mtime,
+                          d.file_hash, d.extraction_complete, d.pages_done)
+    existing = {row[0]: row[1:] for row in query}
+
+    pdf_dir = settings.get_directory('pdf')
+    pending = []
+    for filename in sorted(os.listdir(pdf_dir)):
+        try:
+            document_id, is_test, size, mtime, digest, complete, pages_done = existing[filename]
+        except KeyError:
+            pending.append((filename, None, None, None, None))
+            continue
+        path = os.path.join(pdf_dir, filename)
+        info = None
+        try:
+            stat = os.stat(path)
+            unchanged = size == stat.st_size and mtime == stat.st_mtime
+            if not unchanged:
+                info = file_info(path)
+        except (IOError, OSError) as e:
+            print (filename, e)
+            continue
+        if not unchanged:
+            unchanged = digest is None or digest == info['file_hash']
+            if unchanged:
+                session.execute(document_table.update().where(d.id == document_id)
+                                .values(**info))
+        if not unchanged:
+            pending.append((filename, document_id, is_test, None, info))
+        elif not complete:
+            pending.append((filename, document_id, is_test, pages_done or 0, None))
+    session.commit()
+    return pending
+
+
+def delete_document(session, document_id):
+    """Delete a document with its boxes and lines, without committing."""
+    document_table, box_table, line_table = _tables()
+    session.execute(line_table.delete().where(line_table.c.document_id == document_id))
+    session.execute(box_table.delete().where(box_table.c.document_id == document_id))
+    session.execute(document_table.delete().where(document_table.c.id == document_id))
+
+
+def _attributes(path, is_test, info=None):
+    """Get the attributes to set on a new document for a file, given its file_info if known."""
+    attributes = dict(info) if info is not None else file_info(path)
+    if is_test is not None:
+        attributes['is_test'] = is_test
+    return attributes
+
+
+def ingest(settings, session, workers=1, bulk=False, checkpoint_pages=None,
+           page_cutoff=None):
+    """ Extract all new and changed PDFs to the database.
+
+    Each file is committed in its own transaction, so the extraction can be
+    interrupted and restarted, losing only the files that were in progress.
+    A changed file's old document is deleted in the same transaction.
+    :param settings: A Settings object.
+    :param session: A SQLAlchemy session.
+    :param workers: The number of processes to use for layout analysis.
+    :param bulk: Whether to save boxes and lines with bulk inserts.
+    :param checkpoint_pages: If not None, extract one file at a time, committing
+     after this many pages (see extract.extract_pdf_checkpointed).
+    :param page_cutoff: If not None, only extract this many pages of each file.
+    """
+    pdf_dir = settings.get_directory('pdf')
+    labels = settings.load_labels()
+    layout = settings.layout()
+    pending = pending_files(settings, session)
+
+    if checkpoint_pages is not None:
+        _ingest_checkpointed(settings, session, pdf_dir, pending, labels,
+                             checkpoint_pages, page_cutoff, layout)
+        return
+    if workers > 1:
+        _ingest_parallel(settings, session, pdf_dir, pending, labels,
+                         workers, bulk, page_cutoff, layout)
+        return
+
+    for filename, document_id, is_test, _, info in pending:
+        file_labels = labels.get(filename, {})
+        path = os.path.join(pdf_dir, filename)
+        try:
+            if document_id is not None:
+                delete_document(session, document_id)
+            with open(path, "r") as fp:
+                extract_pdf_data(fp, settings.test_proportion, file_labels,
+                                 session, bulk, _attributes(path, is_test, info), page_cutoff,
+                                 layout=layout)
+        except Exception as e:
+            session.rollback()
+            print (filename, e)
+
+
+def _ingest_checkpointed(settings, session, pdf_dir, pending, labels, checkpoint_pages,
+                         page_cutoff=None, layout=None):
+    """Extract files one at a time with page checkpoints, resuming incomplete documents."""
+    for filename, document_id, is_test, pages_done, info in pending:
+        path = os.path.join(pdf_dir, filename)
+        try:
+            document, attributes = None, None
+            if pages_done is not None:
+                document = session.query(Document).get(document_id)
+            else:
+                if document_id is not None:
+                    delete_document(session, document_id)
+                attributes = _attributes(path, is_test, info)
+            with open(path, "r") as fp:
+                extract_pdf_checkpointed(fp, settings.test_proportion,
+                                         labels.get(filename, {}), session,
+                                         checkpoint_pages, attributes, document,
+                                         page_cutoff, layout)
+        except Exception as e:
+            session.rollback()
+            print (filename, e)
+
+
+def _ingest_parallel(settings, session, pdf_dir, pending, labels, workers,
+                     bulk=False, page_cutoff=None, layout=None):
+    """Run layout analysis in a process pool and save results as they arrive.
+
+    Only this process writes to the database, so the workers never need a session.
+    """
+    replaces = {filename: (document_id, is_test, info)
+                for filename, document_id, is_test, _, info in pending}
+    paths = [os.path.join(pdf_dir, filename) for filename, _, _, _, _ in pending]
+    pool = Pool(workers)
+    try:
+        extract_file = partial(extract_layout, page_cutoff=page_cutoff, layout=layout)
+        for filename, pages, attributes, error in pool.imap_unordered(extract_file, paths):
+            if error is not None:
+                print (filename, error)
+                continue
+            document_id, is_test, info = replaces[filename]
+            attributes.update(_attributes(os.path.join(pdf_dir, filename), is_test, info))
+            try:
+                if document_id is not None:
+                    delete_document(session, document_id)
+                save_layout(filename, pages, settings.test_proportion,
+                            labels.get(filename, {}), session, bulk, attributes)
+            except Exception as e:
+                session.rollback()
+                print (filename, e)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def backfill(settings, session, page_cutoff=None):
+    """ Extract the pages of documents that were left out by a page cutoff.
+
+    Each document's new pages are committed in one transaction. Documents
+    whose files have changed since they were extracted are skipped; they
+    should be extracted again by ingest first.
+    :param settings: A Settings object.
+    :param session: A SQLAlchemy session.
+    :param page_cutoff: If not None, only extract up to this many pages of each document.
+    """
+    document_table = _tables()[0]
+    d = document_table.c
+    query = session.query(d.id, d.filename, d.pages_done, d.num_pages, d.file_size,
+                          d.file_mtime)\
+        .filter(d.extraction_complete == True).filter(d.pages_done != None)\
+        .filter(d.pages_done < d.num_pages).order_by(d.id)
+    if page_cutoff is not None:
+        query = query.filter(d.pages_done < page_cutoff)
+
+    pdf_dir = settings.get_directory('pdf')
+    layout = settings.layout()
+    for document_id, filename, pages_done, num_pages, size, mtime in query.all():
+        path = os.path.join(pdf_dir, filename)
+        try:
+            stat = os.stat(path)
+            if size != stat.st_size or mtime != stat.st_mtime:
+                print (filename, "changed since extraction, skipping")
+                continue
+            with open(path, "r") as fp:
+                pages = list(iter_pages(fp, pages_done, page_cutoff, layout))
+            insert_pages(session, document_id, pages)
+            done = num_pages if page_cutoff is None else min(num_pages, page_cutoff)
+            session.execute(document_table.update().where(d.id == document_id)
+                            .values(pages_done=done))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print (filename, e)
@@ -6,7 +6,8 @@ MAX_LENGTH = 10000
 
 class LabelCandidateFinder(CandidateFinder):
 
-    def __init__(self, field, fid, max_xgap=MAX_LENGTH, max_ygap=MAX_LENGTH, bbox=None):
+    def __init__(self, field, fid, max_xgap=MAX_LENGTH, max_ygap=MAX_LENGTH, bbox=None,
+                 min_page=0, max_page=None):
         """Set up parameters for the candidate search.
 
         :param field: The field to find.
@@ -14,60 +15,52 @@ class LabelCandidateFinder(CandidateFinder):
         :param max_xgap: The largest horizontal gap between label and candidate.
         :param max_ygap: The largest vertical gap between label and candidate.
         :param bbox: The bounding box in which to search.
+        :param min_page: The minimum page number to look for labels on.
+        :param max_page: The maximum page number to look for labels on, or None.
         :return:
         """
         self._max_xgap = max_xgap
         self._max_ygap = max_ygap
         self._counts = {}
         self._bbox = bbox if bbox else [0, 0, MAX_LENGTH, MAX_LENGTH]
+        self._min_page = min_page
+        self._max_page = max_page
         CandidateFinder.__init__(self, field, fid)
 
+    def page_range(self):
+        """Candidates are on the same pages as their labels."""
+        return self._min_page, self._max_page
+
     def _match_labels(self, document):
         """Find lines containing field labels.
 
         :param document: A Document object.
         :return: Generator of 2-tuples of lines and (start, end) of the match.
         """
-        labels = self.field.labels
-        pattern = self.field.settings.pattern_builder.list_pattern(labels)
+        settings = self.field.settings
+        search = settings.pattern_builder.list_regex(self.field.labels).search
+        if settings.label_matcher is not None:
+            name = self.field.name
+            search = lambda text: settings.label_matcher.search(name, text)
         bbox = self._bbox
+        min_page, max_page = self._min_page, self._max_page
 
         for line in document.get_lines():
+            if line.page < min_page or (max_page is not None and line.page > max_page):
+                continue
             if (bbox[0] <= line.x0 and line.x1 <= bbox[2] and
                     bbox[1] <= line.y0 and line.y1 <= bbox[3]):
-                match = re.search(pattern, line.text)
+                match = search(line.text)
                 if match:
                     yield (line, match.span(0))
 
 
     def _find_next_lines(self, line):
         "Find lines following the given one, either vertically or horizontally"
-        next_hor, next_vert = None, None
-
-        candidates = [candidate for candidate in line.document.get_lines()
-                      if candidate.page == line.page]
-        ymin = line.y0 - self._max_ygap
-        xmax = line.x1 + self._max_xgap
-        for cand in candidates:
-            # TODO account for possible page slant
-            # Check for horizontal overlap
-            if (cand.x1 >= line.x0 and cand.x0 <= line.x1 and
-                ymin < cand.y1 < line.y0):
-                try:
-                    if cand.y0 > next_vert.y0:
-                        next_vert = cand
-                except AttributeError:
-                    next_vert = cand
-            # Check for vertical overlap
-            elif ((cand.y0 <= 0.25 * line.y0 + 0.75 * line.y1 <= cand.y1 or
-                   cand.y0 <= 0.75 * line.y0 + 0.25 * line.y1 <= cand.y1) and
-                  line.x1 < cand.x0 < xmax):
-                try:
-                    if cand.x0 < next_hor.x0:
-                        next_hor = cand
-                except AttributeError:
-                    next_hor = cand
-
+        # TODO account for possible page slant
+        index = line.document.page_index(line.page)
+        next_vert = index.next_below(line, line.y0 - self._max_ygap)
+        next_hor = index.next_right(line, line.x1 + self._max_xgap)
         return next_hor, next_vert
 
     def get_candidates(self, document):
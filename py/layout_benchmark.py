@@ -0,0 +1,95 @@
+"""Compare the speed and candidate recall of the full and fast layout profiles.
+
+Each PDF is extracted in memory with both profiles (using the LAParams in
+the settings), and the candidates found by each field are compared. For
+each field, this reports the share of the candidate values found with the
+full layout that are also found with the fast one, and for each profile the
+share of labeled documents that have a candidate matching their label.
+"""
+
+from settings import Settings
+from argparse import ArgumentParser
+from predict import load_pdf, iter_paths
+import os
+import time
+
+PROFILES = ['full', 'fast']
+
+
+def candidate_values(field, document):
+    """Get the values of a field's candidates in a document, keyed by their strings."""
+    return {str(candidate.value): candidate.value for candidate in field.get_candidates(document)}
+
+
+def matches_label(field, label, values, threshold):
+    """Check whether some candidate value compares to a label with at least a threshold score."""
+    return any(field.compare(label, value) >= threshold for value in values)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compare the full and fast layout profiles')
+    parser.add_argument('paths', help='PDF files or directories of them (by default, '
+                        'the pdf directory)', nargs='*')
+    parser.add_argument('--settings', help='the path to the settings file',
+                        default=None)
+    parser.add_argument('--fields', help='the fields to compare (all by default)',
+                        nargs='*', default=None)
+    parser.add_argument('--limit', help='the maximum number of files to use',
+                        type=int, default=None)
+    parser.add_argument('--threshold', help='the comparison score at which a candidate '
+                        'matches a label', type=float, default=1.)
+    args = parser.parse_args()
+
+    settings = Settings(args.settings)
+    fields = args.fields or sorted(settings.fields.keys())
+    labels = settings.load_labels()
+    page_cutoff = settings.page_cutoff(fields)
+    laparams = settings.layout()['laparams']
+
+    seconds = {profile: 0. for profile in PROFILES}
+    found = {name: 0 for name in fields}
+    kept = {name: 0 for name in fields}
+    labeled = {name: 0 for name in fields}
+    label_hits = {(profile, name): 0 for profile in PROFILES for name in fields}
+    count = 0
+    for path in iter_paths(args.paths or [settings.get_directory('pdf')]):
+        if args.limit is not None and count >= args.limit:
+            break
+        filename = os.path.split(path)[-1]
+        values = {}
+        try:
+            for profile in PROFILES:
+                start = time.time()
+                document = load_pdf(path, page_cutoff=page_cutoff,
+                                    layout={'profile': profile, 'laparams': laparams})
+                seconds[profile] += time.time() - start
+                values[profile] = {name: candidate_values(settings.fields[name], document)
+                                   for name in fields}
+        except Exception as e:
+            print (filename, e)
+            continue
+        count += 1
+
+        file_labels = labels.get(filename, {})
+        for name in fields:
+            full, fast = values['full'][name], values['fast'][name]
+            found[name] += len(full)
+            kept[name] += len(set(full) & set(fast))
+            if file_labels.get(name) is None:
+                continue
+            labeled[name] += 1
+            for profile in PROFILES:
+                if matches_label(settings.fields[name], file_labels[name],
+                                 values[profile][name].values(), args.threshold):
+                    label_hits[(profile, name)] += 1
+
+    print("Files: %d" % count)
+    for profile in PROFILES:
+        print("%s layout: %.1f s (%.2f s per file)"
+              % (profile, seconds[profile], seconds[profile] / max(count, 1)))
+    for name in fields:
+        print("%s: %d of %d full layout candidate values found with the fast layout (%.1f%%)"
+              % (name, kept[name], found[name], 100. * kept[name] / max(found[name], 1)))
+        for profile in PROFILES:
+            print("    label recall with %s layout: %d of %d"
+                  % (profile, label_hits[(profile, name)], labeled[name]))
@@ -7,8 +7,8 @@ from pdfminer.pdfparser import PDFParser, PDFSyntaxError
 from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-from pdfminer.converter import PDFPageAggregator
-from pdfminer.layout import LAParams, LTTextBox, LTTextLine, LTChar
+from pdfminer.layout import LTTextBox, LTTextLine, LTChar
+from extract import layout_device
 
 #PDF writing
 from reportlab.pdfgen import canvas
@@ -20,8 +20,11 @@ def make_rectangle(canvas, bbox):
            bbox[3]-bbox[1])
 
 
-def mark_pdf(clean_path, marked_path):
-    """Draw rectangles around the boxes, lines, and characters in a document."""
+def mark_pdf(clean_path, marked_path, layout=None):
+    """ Draw rectangles around the boxes, lines, and characters in a document.
+
+    :param layout: The layout profile and parameters (see extract.layout_device).
+    """
     try:
         with open(os.path.join(clean_path)) as fp:
             parser = PDFParser(fp)
@@ -29,8 +32,7 @@ def mark_pdf(clean_path, marked_path):
             parser.set_document(pdf)
 
             rsrcmgr = PDFResourceManager()
-            laparams = LAParams()
-            device = PDFPageAggregator(rsrcmgr, laparams=laparams)
+            device = layout_device(rsrcmgr, layout)
             interpreter = PDFPageInterpreter(rsrcmgr, device)
 
             marked_dir, marked_fn = os.path.split(marked_path)
@@ -85,4 +87,4 @@ if __name__ == "__main__":
     clean_path = os.path.join(pdf_dir, args.filename)
     marked_path = os.path.join(marked_pdf_dir, args.filename)
 
-    mark_pdf(clean_path, marked_path)
\ No newline at end of file
+    mark_pdf(clean_path, marked_path, settings.layout())
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Measure the memory needed to hold documents in memory, as ORM objects or compactly.
+
+Run once with and once without --compact and compare the reported peak memory.
+"""
+
+from settings import Settings
+from argparse import ArgumentParser
+from document_loader import document_query, iter_document_chunks, iter_compact_chunks
+import resource
+import sys
+
+
+def peak_memory():
+    """Get the peak resident memory of this process in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux reports kilobytes, OS X bytes.
+    return peak / (1024. * 1024.) if sys.platform == 'darwin' else peak / 1024.
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measure the memory used by loaded documents')
+    parser.add_argument('--settings', help='the path to the settings file',
+                        default=None)
+    parser.add_argument('--test', help='flag indicating that test set should be used',
+                        action='store_true', default=False)
+    parser.add_argument('--compact', help='hold documents as CompactDocuments',
+                        action='store_true', default=False)
+    parser.add_argument('--chunk-size', help='the number of compact documents to load at a time',
+                        type=int, default=100)
+    args = parser.parse_args()
+
+    settings = Settings(args.settings)
+    settings.map_tables()
+    session = settings.session()
+    before = peak_memory()
+
+    documents = []
+    if args.compact:
+        for chunk in iter_compact_chunks(session, args.test, args.chunk_size):
+            documents.extend(chunk)
+        print("Array and text size: %.1f MB"
+              % (sum(document.nbytes() for document in documents) / (1024. * 1024.)))
+    else:
+        documents = next(iter_document_chunks(session, document_query(session, args.test)))
+        for document in documents:
+            #Boxes are loaded lazily, so load them as they would be by the features.
+            document.get_boxes()
+
+    lines = sum(len(document.get_lines()) for document in documents)
+    print("Documents: %d, lines: %d" % (len(documents), lines))
+    print("Peak memory: %.1f MB (%.1f MB before loading)" % (peak_memory(), before))
@@ -0,0 +1,69 @@
+"""Bring an existing database up to date with the schema in schema.py."""
+
+from sqlalchemy import inspect
+
+
+def add_missing_indexes(engine, metadata):
+    """ Create the indexes defined in the schema that the database lacks.
+
+    :param engine: A SQLAlchemy engine.
+    :param metadata: The MetaData returned by Settings.map_tables.
+    :return: A list of the names of the indexes created.
+    """
+    inspector = inspect(engine)
+    created = []
+    for table in metadata.sorted_tables:
+        existing = set(index['name'] for index in inspector.get_indexes(table.name))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(engine)
+                created.append(index.name)
+    return created
+
+
+def add_missing_columns(engine, metadata):
+    """ Add the columns defined in the schema that existing tables lack.
+
+    The columns are added with ALTER TABLE, so they must be nullable or have
+    a server default. Existing rows get the default, or NULL.
+    The primary key of a column, its indexes and its foreign keys are not added.
+    :param engine: A SQLAlchemy engine.
+    :param metadata: The MetaData returned by Settings.map_tables.
+    :return: A list of the names of the columns added, as table.column.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = set(column['name'] for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            sql = "ALTER TABLE %s ADD COLUMN %s %s" % (
+                table.name, column.name, column.type.compile(dialect=engine.dialect))
+            if column.server_default is not None:
+                default = column.server_default.arg
+                if hasattr(default, 'compile'):
+                    default = default.compile(dialect=engine.dialect)
+                sql += " DEFAULT %s" % default
+            if not column.nullable:
+                sql += " NOT NULL"
+            engine.execute(sql)
+            added.append("%s.%s" % (table.name, column.name))
+    return added
+
+
+def migrate(engine, metadata):
+    """ Add everything in the schema that is missing from an existing database.
+
+    Tables that don't exist yet are created as well.
+    :param engine: A SQLAlchemy engine.
+    :param metadata: The MetaData returned by Settings.map_tables.
+    """
+    for name in add_missing_columns(engine, metadata):
+        print("Added column %s" % name)
+    metadata.create_all(engine)
+    for name in add_missing_indexes(engine, metadata):
+        print("Created index %s" % name)
@@ -0,0 +1,94 @@
+"""Load trained models once per process.
+
+Models are cached by path. Each time a model is asked for, its file is
+checked with a stat call; it is read again only if its size or modification
+time has changed and its SHA-256 hash no longer matches the loaded copy.
+
+train.py saves each model both as a pickle (name.pkl) and with joblib
+(name.joblib). The joblib file is preferred, and its NumPy arrays are
+memory-mapped read-only, so processes loading the same model share one copy
+of the arrays the estimator keeps as they are (such as the coefficients of
+linear models). This does not help random forests or other tree models:
+scikit-learn's trees copy their node arrays into memory of their own when
+they are unpickled. To share them, load the models before forking worker
+processes (see predict.load_models), so the workers share the parent's copy.
+
+Loaded models are shared by all callers in a process, so callers shouldn't
+modify them; set attributes such as ModelWrapper.data on a copy instead.
+"""
+
+import hashlib
+import pickle
+import os
+
+try:
+    import joblib
+except ImportError:
+    from sklearn.externals import joblib
+
+#Loaded models, keyed by path, as (size, mtime, hash, model) tuples.
+_models = {}
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def model_paths(directory, name):
+    """Get the joblib and pickle paths of a model saved by train.py."""
+    base = os.path.join(directory, name)
+    return base + ".joblib", base + ".pkl"
+
+
+def save_model(model, directory, name):
+    """ Save a model with both joblib and pickle.
+
+    :param model: The model to save.
+    :param directory: The directory to save it in.
+    :param name: The name of the model definition file.
+    :return: The path of the pickle file.
+    """
+    joblib_path, pickle_path = model_paths(directory, name)
+    joblib.dump(model, joblib_path)
+    with open(pickle_path, 'wb') as f:
+        pickle.dump(model, f)
+    return pickle_path
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load(path):
+    if path.endswith(".joblib"):
+        return joblib.load(path, mmap_mode='r')
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_model(directory, name):
+    """ Get a model saved by train.py, loading it if it isn't loaded or has changed.
+
+    :param directory: The directory the model was saved in.
+    :param name: The name of the model definition file.
+    :return: The model.
+    """
+    joblib_path, pickle_path = model_paths(directory, name)
+    path = joblib_path if os.path.exists(joblib_path) else pickle_path
+    stat = os.stat(path)
+    size, mtime, digest, model = _models.get(path, (None, None, None, None))
+    if size == stat.st_size and mtime == stat.st_mtime:
+        return model
+
+    new_digest = _file_hash(path)
+    if new_digest != digest:
+        model = _load(path)
+    _models[path] = stat.st_size, stat.st_mtime, new_digest, model
+    return model
+
+
+def clear():
+    """Forget all loaded models."""
+    _models.clear()
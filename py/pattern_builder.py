@@ -1,3 +1,6 @@
+import re
+
+
 class PatternBuilder(object):
     """Class for building and caching patterns"""
     def __init__(self, substitutions):
@@ -11,6 +14,7 @@ class PatternBuilder(object):
         self._char_patterns = {}
         self._string_patterns = {}
         self._list_patterns = {}
+        self._list_regexes = {}
 
     def character_pattern(self, character):
         """Get a pattern to match a given character."""
@@ -45,3 +49,91 @@ class PatternBuilder(object):
             self._list_patterns[key] = "|".join(["(?:" + self.string_pattern(string) + ")"
                 for string in strings])
             return self._list_patterns[key]
+
+    def list_regex(self, strings):
+        """Get a compiled regular expression to match one string in a list."""
+        key = frozenset(strings)
+        try:
+            return self._list_regexes[key]
+        except KeyError:
+            self._list_regexes[key] = re.compile(self.list_pattern(strings))
+            return self._list_regexes[key]
+
+    def trie_pattern(self, strings):
+        """Get a pattern to match one string in a list, factored on common prefixes.
+
+        This matches the same strings as list_pattern, but shared prefixes are
+        only tried once, which keeps long alternations of labels fast.
+        """
+        trie = {}
+        for string in set(strings + [string.upper() for string in strings]):
+            node = trie
+            for c in string:
+                node = node.setdefault(c, {})
+            node[None] = True
+        return self._trie_node_pattern(trie)
+
+    def _trie_node_pattern(self, node):
+        """Get a pattern to match the strings stored below a node of a trie."""
+        substitutions = self._substitutions
+        branches = []
+        for c in sorted(key for key in node if key is not None):
+            child = node[c]
+            branch = c if c not in substitutions else self.character_pattern(c)
+            rest = self._trie_node_pattern(child)
+            if rest:
+                branch += "(?:\s*(?:" + rest + "))" + ("?" if None in child else "")
+            branches.append(branch)
+        return "|".join(branches)
+
+
+class LabelMatcher(object):
+    """Find the labels of all fields in a line with a single scan.
+
+    A combined pattern for every label is tried first, and the patterns of
+    individual fields are only tried on the (usually few) lines it matches.
+    """
+    CACHE_SIZE = 100000
+
+    def __init__(self, pattern_builder, labels):
+        """Build the combined pattern.
+
+        :param pattern_builder: A PatternBuilder.
+        :param labels: A dict of lists of labels, keyed by field name.
+        """
+        self._regexes = {name: pattern_builder.list_regex(field_labels)
+                         for name, field_labels in labels.iteritems()}
+        if all(labels.values()):
+            all_labels = sum(labels.values(), [])
+            self._any = re.compile(pattern_builder.trie_pattern(all_labels))
+        else:
+            # An empty label list matches every line, so nothing can be skipped.
+            self._any = None
+        self._cache = {}
+
+    def matches(self, text):
+        """Find the first label match for each field in a line of text.
+
+        :param text: The text to search.
+        :return: A dict of match objects keyed by field name. Fields without
+         a match are omitted.
+        """
+        try:
+            return self._cache[text]
+        except KeyError:
+            if self._any is not None and self._any.search(text) is None:
+                result = {}
+            else:
+                result = {}
+                for name, regex in self._regexes.iteritems():
+                    match = regex.search(text)
+                    if match:
+                        result[name] = match
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache = {}
+            self._cache[text] = result
+            return result
+
+    def search(self, name, text):
+        """Find the first match for one field's labels, like re.search."""
+        return self.matches(text).get(name)
@@ -1,4 +1,132 @@
-class Document(object):
+import bisect
+import math
+
+
+class PageIndex(object):
+    """Spatial index over the lines on a single page.
+
+    Lines are kept sorted by top edge for searching downwards, and in
+    horizontal bands sorted by left edge for searching to the right.
+    Ties are broken by the order in which lines appear in the document.
+    """
+    BAND_HEIGHT = 20.
+
+    def __init__(self, lines):
+        """Build the index.
+
+        :param lines: A list of lines on the page, in document order.
+        """
+        order = range(len(lines))
+        self._by_top = sorted(order, key=lambda i: -lines[i].y1)
+        self._tops = [-lines[i].y1 for i in self._by_top]
+        self._bands = {}
+        self._band_lefts = {}
+        for i in sorted(order, key=lambda i: lines[i].x0):
+            line = lines[i]
+            for band in range(self._band(line.y0), self._band(line.y1) + 1):
+                self._bands.setdefault(band, []).append(i)
+                self._band_lefts.setdefault(band, []).append(line.x0)
+        self._lines = lines
+
+    def _band(self, y):
+        return int(math.floor(y / self.BAND_HEIGHT))
+
+    def next_below(self, line, ymin):
+        """Find the highest line below the given one that overlaps it horizontally.
+
+        :param line: The line to search from.
+        :param ymin: Only lines whose top is above this are considered.
+        :return: The line with the greatest y0 among lines with
+         ymin < y1 < line.y0 that overlap line horizontally, or None.
+        """
+        lines = self._lines
+        best, best_index = None, None
+        start = bisect.bisect_right(self._tops, -line.y0)
+        for i in self._by_top[start:]:
+            cand = lines[i]
+            if cand.y1 <= ymin:
+                break
+            if best is not None and cand.y1 < best.y0:
+                # Nothing further down can have a higher bottom edge.
+                break
+            if cand.x1 >= line.x0 and cand.x0 <= line.x1:
+                if best is None or cand.y0 > best.y0 or \
+                        (cand.y0 == best.y0 and i < best_index):
+                    best, best_index = cand, i
+        return best
+
+    def next_right(self, line, xmax):
+        """Find the nearest line to the right of the given one that overlaps it vertically.
+
+        :param line: The line to search from.
+        :param xmax: Only lines whose left edge is left of this are considered.
+        :return: The line with the smallest x0 among lines with
+         line.x1 < x0 < xmax containing the point 1/4 or 3/4 of the way
+         up the given line, or None.
+        """
+        lines = self._lines
+        best, best_index = None, None
+        for y in (0.25 * line.y0 + 0.75 * line.y1, 0.75 * line.y0 + 0.25 * line.y1):
+            band = self._band(y)
+            members = self._bands.get(band, [])
+            start = bisect.bisect_right(self._band_lefts.get(band, []), line.x1)
+            for i in members[start:]:
+                cand = lines[i]
+                if cand.x0 >= xmax or (best is not None and cand.x0 > best.x0):
+                    break
+                if cand.y0 <= y <= cand.y1:
+                    if best is None or cand.x0 < best.x0 or \
+                            (cand.x0 == best.x0 and i < best_index):
+                        best, best_index = cand, i
+                    break
+        return best
+
+
+class LayoutIndex(object):
+    """Spatial lookups over the lines and boxes of a document.
+
+    Subclasses provide get_lines and get_boxes. The indices are cached in the
+    instance, so subclasses should discard _page_indices and _box_tops if
+    their lines or boxes change.
+    """
+    def page_index(self, page):
+        """Get a spatial index over the lines on a page.
+
+        The indices for all pages are built together the first time one is needed.
+        """
+        try:
+            indices = self._page_indices
+        except AttributeError:
+            by_page = {}
+            for line in self.get_lines():
+                by_page.setdefault(line.page, []).append(line)
+            indices = {p: PageIndex(by_page[p]) for p in by_page}
+            self._page_indices = indices
+        try:
+            return indices[page]
+        except KeyError:
+            return PageIndex([])
+
+    def box_rank(self, page, y1):
+        """Count the boxes on a page whose top edge is strictly above y1.
+
+        The top edges of the boxes on each page are sorted once and cached,
+        so each rank is a binary search.
+        """
+        try:
+            tops = self._box_tops
+        except AttributeError:
+            tops = {}
+            for box in self.get_boxes():
+                tops.setdefault(box.page, []).append(box.y1)
+            for page_tops in tops.values():
+                page_tops.sort()
+            self._box_tops = tops
+        page_tops = tops.get(page, [])
+        return len(page_tops) - bisect.bisect_right(page_tops, y1)
+
+
+class Document(LayoutIndex):
     """Class that represents a single PDF document."""
     def __init__(self, filename='', num_pages=1, is_test=False):
         self.filename = filename
@@ -14,6 +142,7 @@ class Document(object):
         except AttributeError:
             #This was loaded from the database and so the constructor never ran.
             pass
+        self.__dict__.pop('_page_indices', None)
 
     def add_box(self, box):
         """Add a box to a document that wasn't loaded from the database."""
@@ -21,6 +150,7 @@ class Document(object):
             self._boxes.append(box)
         except AttributeError:
             pass
+        self.__dict__.pop('_box_tops', None)
 
     def get_lines(self):
         """Get all lines for this document, regardless of how it was loaded."""
@@ -40,6 +170,7 @@ class Document(object):
             # Constructors not called when loading from DB!
             return self.boxes
 
+
 class Box(object):
     """Class that represents a single box, as returned by PDFMiner."""
     def __init__(self, **kwargs):
@@ -0,0 +1,275 @@
+"""Predict the field values of PDFs.
+
+predict_pdf runs layout analysis, candidate finding, features and models on
+a single PDF entirely in memory, without the database. Only the pages that
+the fields' candidate finders look at are analyzed.
+
+Run as a script, it predicts the values of PDF files and writes one JSON
+object per file to standard output:
+
+    python predict.py paper.pdf more_papers/
+    find incoming -name "*.pdf" | python predict.py --workers 4
+
+With --database, it instead fills in the prediction columns of documents
+already in the database (see predict_database).
+"""
+
+from settings import Settings
+from argparse import ArgumentParser
+from extract import extract_pdf_data
+from compact_document import CompactDocument
+from multiprocessing import Pool
+from io import BytesIO
+import gc
+import json
+import os
+import sys
+import time
+
+#Settings loaded by default_settings, keyed by path.
+_settings = {}
+
+
+def default_settings(path=None):
+    """Get the settings from a file, loading them only once per process."""
+    key = os.path.abspath(path) if path else None
+    try:
+        return _settings[key]
+    except KeyError:
+        _settings[key] = settings = Settings(path)
+        return settings
+
+
+def load_pdf(source, filename=None, page_cutoff=None, layout=None):
+    """ Extract a PDF into a CompactDocument.
+
+    :param source: The path of the PDF, its contents, or a file opened in binary mode.
+    :param filename: The name to give the document (by default, that of the file).
+    :param page_cutoff: If not None, only extract this many pages.
+    :param layout: The layout profile and parameters (see extract.layout_device).
+    :return: A CompactDocument with id 0.
+    :raises ValueError: If source is bytes that are neither a PDF nor a path.
+    """
+    if hasattr(source, 'read'):
+        document = extract_pdf_data(source, page_cutoff=page_cutoff, filename=filename,
+                                    layout=layout)
+    elif isinstance(source, bytes) and b"%PDF" in source[:1024]:
+        #The PDF header must be in the first 1024 bytes.
+        document = extract_pdf_data(BytesIO(source), page_cutoff=page_cutoff,
+                                    filename=filename or '', layout=layout)
+    elif isinstance(source, bytes) and (b"\0" in source or not os.path.isfile(source)):
+        #In Python 2, paths are bytes too, and can't contain null bytes.
+        raise ValueError("Data is neither a PDF nor the path of a file")
+    else:
+        with open(source, "rb") as fp:
+            document = extract_pdf_data(fp, page_cutoff=page_cutoff, filename=filename,
+                                        layout=layout)
+    document = CompactDocument.from_document(document)
+    #Candidates are keyed by document id, which an unsaved document lacks.
+    document.id = 0
+    return document
+
+
+def _milliseconds(start):
+    return round((time.time() - start) * 1000, 1)
+
+
+def predict_pdf(source, fields=None, settings=None, filename=None):
+    """ Predict the values of some fields for a PDF, without the database.
+
+    :param source: The path of the PDF, its contents, or a file opened in binary mode.
+    :param fields: The names of the fields to predict (by default, all of them).
+    :param settings: A Settings object (by default, the default settings file).
+    :param filename: The name of the PDF, if source isn't a path.
+    :return: A dict with the filename, number of pages, predicted values keyed
+     by field name, and the time taken by layout analysis, each field and in
+     total, in milliseconds.
+    """
+    start = time.time()
+    if settings is None:
+        settings = default_settings()
+    if fields is None:
+        fields = sorted(settings.fields.keys())
+    document = load_pdf(source, filename, settings.page_cutoff(fields), settings.layout())
+    timings = {'layout': _milliseconds(start)}
+    values = {}
+    for name in fields:
+        field_start = time.time()
+        values[name] = settings.fields[name].predict(document)
+        timings[name] = _milliseconds(field_start)
+    timings['total'] = _milliseconds(start)
+    return {'filename': document.filename, 'pages': document.num_pages,
+            'values': values, 'timings_ms': timings}
+
+
+def iter_paths(paths):
+    """ Generate the paths of PDF files to predict.
+
+    :param paths: Paths of files and of directories, whose PDFs are used in
+     order of name. A path of - stands for paths read from standard input,
+     one per line, which is also the default if there are no paths.
+    """
+    for path in paths or ['-']:
+        if path == '-':
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.lower().endswith('.pdf'):
+                    yield os.path.join(path, filename)
+        else:
+            yield path
+
+
+def predict_database(settings, session, fields, chunk_size=100, redo=False, labeled=False):
+    """ Predict field values of documents in the database and save them.
+
+    Documents are loaded in chunks. For each field, candidates are found and
+    features computed for the whole chunk, and the model is called once per
+    chunk (see Field.predict_documents). The predictions of a chunk are saved
+    with a single executemany UPDATE and committed, so an interrupted run
+    only repeats the chunk that was in progress. The time of the prediction
+    is saved as well, so documents for which no value could be predicted
+    aren't selected again.
+    :param settings: A Settings object.
+    :param session: A SQLAlchemy session.
+    :param fields: The names of the fields to predict.
+    :param chunk_size: The number of documents per chunk.
+    :param redo: If False, only select documents that haven't been predicted
+     for some of the fields.
+    :param labeled: If False, only select documents lacking a label for
+     some of the fields.
+    :return: The number of documents predicted.
+    """
+    from schema import prediction_column, predicted_at_column
+    from pdf_classes import Document
+    from document_loader import iter_compact_chunks
+    from sqlalchemy import bindparam, and_, or_
+    from sqlalchemy.orm import class_mapper
+    table = class_mapper(Document).local_table
+    columns = [prediction_column(name) for name in fields]
+    times = [predicted_at_column(name) for name in fields]
+    conditions = []
+    if not redo:
+        conditions.append(or_(*[table.c[column] == None for column in times]))
+    if not labeled:
+        conditions.append(or_(*[table.c[name] == None for name in fields]))
+    where = and_(*conditions) if conditions else None
+    #Bind parameters can't share the names of the columns being updated.
+    update = table.update().where(table.c.id == bindparam('_id'))\
+        .values({column: bindparam('_' + column) for column in columns + times})
+
+    count = 0
+    start = time.time()
+    for chunk in iter_compact_chunks(session, chunk_size=chunk_size, where=where):
+        rows = [{'_id': document.id} for document in chunk]
+        for name, column, time_column in zip(fields, columns, times):
+            values = settings.fields[name].predict_documents(chunk)
+            now = time.time()
+            for row, value in zip(rows, values):
+                row['_' + column] = value
+                row['_' + time_column] = now
+        session.execute(update, rows)
+        session.commit()
+        count += len(chunk)
+        elapsed = time.time() - start
+        print("%d documents in %.1f s (%.1f documents/s)"
+              % (count, elapsed, count / max(elapsed, 1e-6)))
+    return count
+
+
+def load_models(settings, fields):
+    """ Load the models of some fields before starting worker processes.
+
+    Forked workers share the parent's copy of the models until one of them
+    writes to it, so they don't each need their own. This is the only way
+    random forests are shared, since their trees are copied when unpickled.
+    :param settings: A Settings object.
+    :param fields: The names of the fields.
+    """
+    for name in fields:
+        settings.fields[name]._check_model()
+    #Keep the garbage collector from writing to the pages of the loaded objects.
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+#The settings and field names of a worker process, set by predict_files
+#before the workers are forked or by _init_worker.
+_worker = {}
+
+
+def _init_worker(settings_path, fields):
+    if 'settings' not in _worker:
+        _worker['settings'] = default_settings(settings_path)
+    _worker['fields'] = fields
+
+
+def _predict_path(path):
+    """Predict the values of a file in a worker process, catching any error."""
+    try:
+        return predict_pdf(path, _worker['fields'], _worker['settings'])
+    except Exception as e:
+        return {'filename': os.path.split(path)[-1], 'error': "%s: %s" % (type(e).__name__, e)}
+
+
+def predict_files(settings, fields, paths, workers=1):
+    """ Predict the values of PDF files and write them to standard output as JSON lines.
+
+    :param settings: A Settings object.
+    :param fields: The names of the fields to predict.
+    :param paths: Paths of files and directories (see iter_paths).
+    :param workers: The number of processes to use.
+    """
+    pool = None
+    _worker.update(settings=settings, fields=fields)
+    if workers > 1:
+        load_models(settings, fields)
+        pool = Pool(workers, _init_worker, (os.path.abspath(settings.filename), fields))
+        results = pool.imap(_predict_path, iter_paths(paths))
+    else:
+        results = (_predict_path(path) for path in iter_paths(paths))
+    try:
+        for result in results:
+            #Dates and other non-JSON values are written as strings.
+            sys.stdout.write(json.dumps(result, default=str) + "\n")
+            sys.stdout.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Predict the field values of PDF files')
+    parser.add_argument('paths', help='PDF files or directories of them (- or none to read '
+                        'paths from standard input)', nargs='*')
+    parser.add_argument('--settings', help='the path to the settings file',
+                        default=None)
+    parser.add_argument('--fields', help='the fields to predict (all by default)',
+                        nargs='*', default=None)
+    parser.add_argument('--workers', help='the number of processes to use',
+                        type=int, default=1)
+    parser.add_argument('--database', help='predict the documents in the database '
+                        'instead of files, saving the predictions', action='store_true')
+    parser.add_argument('--chunk-size', help='the number of documents to predict at a '
+                        'time with --database', type=int, default=100)
+    parser.add_argument('--redo', help='with --database, predict documents that already '
+                        'have been predicted', action='store_true')
+    parser.add_argument('--labeled', help='with --database, also predict documents that '
+                        'are labeled', action='store_true')
+    args = parser.parse_args()
+
+    settings = default_settings(args.settings)
+    fields = args.fields or sorted(settings.fields.keys())
+    unknown = set(fields) - set(settings.fields.keys())
+    if unknown:
+        parser.error("unknown fields: %s" % ", ".join(sorted(unknown)))
+
+    if args.database:
+        settings.map_tables()
+        predict_database(settings, settings.session(), fields, args.chunk_size, args.redo,
+                         args.labeled)
+    else:
+        predict_files(settings, fields, args.paths, args.workers)
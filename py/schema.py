@@ -1,17 +1,43 @@
 #from pdf_classes import *
-from sqlalchemy import Column, ForeignKey, Table
-from sqlalchemy import Integer, Float, Boolean
+from sqlalchemy import Column, ForeignKey, Index, Table
+from sqlalchemy import Integer, BigInteger, Float, Boolean
+from sqlalchemy.sql.expression import true
 from fields import *
 
+def prediction_column(field_name):
+    """Get the name of the column storing a field's predicted values."""
+    return "predicted_%s" % field_name
+
+
+def predicted_at_column(field_name):
+    """Get the name of the column storing when a field was last predicted."""
+    return "predicted_at_%s" % field_name
+
+
 # TODO: allow configuration of string lengths
 def document_table(fields, metadata):
-    """Generate the table to store the Document class."""
+    """Generate the table to store the Document class.
+
+    Each field has a column for its label, one for its predicted value and
+    one for the time it was predicted, which is set even if no value could
+    be predicted.
+    """
     return Table('document', metadata,
                  Column('id', Integer, primary_key=True),
                  Column('filename', String(255), unique=True),
                  Column('num_pages', Integer),
                  Column('is_test', Boolean, index=True),
-                 *(Column(fn, field.col_type) for fn, field in fields.iteritems())
+                 Column('file_size', BigInteger),
+                 Column('file_mtime', Float(precision=53)),
+                 Column('file_hash', String(64)),
+                 Column('pages_done', Integer),
+                 Column('extraction_complete', Boolean, server_default=true(),
+                        nullable=False, index=True),
+                 *([Column(fn, field.col_type) for fn, field in fields.iteritems()] +
+                   [Column(prediction_column(fn), field.col_type)
+                    for fn, field in fields.iteritems()] +
+                   [Column(predicted_at_column(fn), Float(precision=53))
+                    for fn in fields])
               )
 
 
@@ -25,7 +51,8 @@ def box_table(metadata):
                  Column('y0', Float),
                  Column('x1', Float),
                  Column('y1', Float),
-                 Column('vertical', Boolean)
+                 Column('vertical', Boolean),
+                 Index('ix_box_document_id_page', 'document_id', 'page')
                  )
 
 
@@ -41,5 +68,7 @@ def line_table(metadata):
                  Column('x1', Float),
                  Column('y1', Float),
                  Column('vertical', Boolean),
-                 Column('text', String(1023))
+                 Column('text', String(1023)),
+                 Index('ix_line_document_id_page', 'document_id', 'page'),
+                 Index('ix_line_box_id', 'box_id')
                  )
@@ -0,0 +1,160 @@
+"""A long-running HTTP service that extracts metadata from PDFs.
+
+Settings, candidate finders, features and models are loaded once when the
+service starts, rather than once per document. They are loaded before the
+worker processes are forked, so the workers share one copy of the models.
+A PDF is extracted and its fields predicted entirely in memory, without
+the database (see predict.predict_pdf).
+
+    python service.py --settings ../settings.yml --port 8080 --workers 4
+    curl --data-binary @paper.pdf -H "X-Filename: paper.pdf" \\
+        "http://127.0.0.1:8080/extract?fields=title,author"
+
+The response is a JSON object with the predicted value of each field and
+the time spent on layout analysis and on each field, in milliseconds.
+GET /health lists the available fields.
+"""
+
+from settings import Settings
+from argparse import ArgumentParser
+from predict import predict_pdf, load_models
+from multiprocessing import Pool
+import json
+import os
+import time
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+#The settings of a worker process, set before the workers are forked or by _init_worker.
+_worker = {}
+
+
+def _init_worker(settings_path, field_names):
+    """Load the settings and the models of the fields in a worker process that lacks them."""
+    if 'settings' in _worker:
+        return
+    settings = Settings(settings_path)
+    load_models(settings, field_names)
+    _worker['settings'] = settings
+
+
+def _milliseconds(start):
+    return round((time.time() - start) * 1000, 1)
+
+
+def extract_values(data, filename, field_names):
+    """ Extract a PDF and predict the values of some fields in a worker process.
+
+    :param data: The contents of the PDF file.
+    :param filename: The name of the PDF file.
+    :param field_names: The names of the fields to predict.
+    :return: A 2-tuple of a dict with the values and timings (see
+     predict.predict_pdf), and an error message (None if extraction succeeded).
+    """
+    try:
+        result = predict_pdf(data, field_names, _worker['settings'], filename)
+        result['worker'] = os.getpid()
+        return result, None
+    except Exception as e:
+        return None, "%s: %s" % (type(e).__name__, e)
+
+
+class ExtractionServer(ThreadingMixIn, HTTPServer):
+    """An HTTP server that hands PDFs to a pool of worker processes."""
+    daemon_threads = True
+
+    def __init__(self, address, pool, field_names):
+        HTTPServer.__init__(self, address, ExtractionHandler)
+        self.pool = pool
+        self.field_names = field_names
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    """Handle requests to extract a PDF or check the service's health."""
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._respond(404, {'error': "Not found"})
+            return
+        self._respond(200, {'status': "ok", 'fields': sorted(self.server.field_names)})
+
+    def do_POST(self):
+        start = time.time()
+        url = urlparse(self.path)
+        if url.path != '/extract':
+            self._respond(404, {'error': "Not found"})
+            return
+
+        field_names = self.server.field_names
+        query = parse_qs(url.query)
+        if 'fields' in query:
+            field_names = [name for names in query['fields'] for name in names.split(',')]
+            unknown = set(field_names) - set(self.server.field_names)
+            if unknown:
+                self._respond(400, {'error': "Unknown fields: %s" % ", ".join(sorted(unknown))})
+                return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length == 0:
+            self._respond(400, {'error': "No PDF in request body"})
+            return
+        data = self.rfile.read(length)
+        filename = self.headers.get('X-Filename') or 'upload.pdf'
+
+        result, error = self.server.pool.apply(extract_values, (data, filename, field_names))
+        if error is not None:
+            self._respond(500, {'filename': filename, 'error': error})
+            return
+        #Include the time spent waiting for a worker.
+        result['timings_ms']['request'] = _milliseconds(start)
+        self._respond(200, result)
+
+    def _respond(self, status, body):
+        #Dates and other non-JSON values are sent as strings.
+        content = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Run a service that extracts metadata from PDFs')
+    parser.add_argument('--settings', help='the path to the settings file',
+                        default=None)
+    parser.add_argument('--host', help='the address to listen on', default='127.0.0.1')
+    parser.add_argument('--port', help='the port to listen on', type=int, default=8080)
+    parser.add_argument('--workers', help='the number of extraction processes',
+                        type=int, default=1)
+    parser.add_argument('--fields', help='the fields to predict by default (all by default)',
+                        nargs='*', default=None)
+    args = parser.parse_args()
+
+    settings = Settings(args.settings)
+    settings_path = os.path.abspath(settings.filename)
+    field_names = args.fields or sorted(settings.fields.keys())
+    unknown = set(field_names) - set(settings.fields.keys())
+    if unknown:
+        parser.error("unknown fields: %s" % ", ".join(sorted(unknown)))
+
+    load_models(settings, field_names)
+    _worker['settings'] = settings
+    pool = Pool(args.workers, _init_worker, (settings_path, field_names))
+    server = ExtractionServer((args.host, args.port), pool, field_names)
+    print("Serving %s on %s:%d with %d workers"
+          % (", ".join(field_names), args.host, args.port, args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.terminate()
+        pool.join()
@@ -3,7 +3,6 @@ import collections
 import os
 import importlib
 import pattern_builder
-import re
 
 
 class Settings:
@@ -31,6 +30,7 @@ class Settings:
         self._set_directories()
         self._extra_labels = self._data['extra_labels']
         self.test_proportion = self._data['test_proportion']
+        self._load_label_patterns()
 
     def _load_from_file(self):
         """Load the settings from the given filename."""
@@ -43,10 +43,17 @@ class Settings:
         maker = sqlalchemy.orm.sessionmaker(bind=self.engine())
         return maker()
 
+    #Pragmas set on every SQLite connection unless overridden in the db settings.
+    SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+                      'temp_store': 'MEMORY', 'cache_size': -64000,
+                      'mmap_size': 268435456}
+
     def engine(self):
         """Get a SQLAlchemy engine object for the specified database."""
         import sqlalchemy
         db = self._data['db']
+        if db['backend'] == 'sqlite':
+            return self._sqlite_engine(db)
         address = "%s://%s:%s@%s:%d/%s" % (db['backend'], db['username'],
                                            db['password'], db['server'],
                                            db['port'], db['name'])
@@ -54,6 +61,29 @@ class Settings:
             address += "?charset=%s" % db['charset']
         return sqlalchemy.create_engine(address)
 
+    def _sqlite_engine(self, db):
+        """ Get an engine for a local SQLite database file.
+
+        The name is the path of the database file, relative to the settings
+        file. The database is used in WAL mode, so readers (such as export
+        workers) don't block each other or the writer.
+        """
+        import sqlalchemy
+        from sqlalchemy import event
+        pragmas = dict(self.SQLITE_PRAGMAS)
+        pragmas.update(db.get('pragmas', {}))
+        engine = sqlalchemy.create_engine("sqlite:///%s" % self.resolve_path(db['name']),
+                                          connect_args={'timeout': db.get('timeout', 30)})
+
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(connection, record):
+            cursor = connection.cursor()
+            for name, value in sorted(pragmas.iteritems()):
+                cursor.execute("PRAGMA %s = %s" % (name, value))
+            cursor.close()
+
+        return engine
+
     def _set_files(self):
         """Get filenames from  settings dictionary and store absolute paths."""
         files = collections.defaultdict(dict, self._data['files'])
@@ -117,17 +147,57 @@ class Settings:
         with open(self.get_file('label'), "r") as f:
             return yaml.load(f)
 
+    def _load_label_patterns(self):
+        """Compile the patterns used to find and strip labels.
+
+        If combined_labels is set in the settings file, a LabelMatcher is
+        built to find the labels of all fields in a line at once.
+        """
+        self.all_labels = sum([field.labels for field in self.fields.values()], self._extra_labels)
+        self._label_regex = self.pattern_builder.list_regex(self.all_labels)
+        self.label_matcher = None
+        if self._data.get('combined_labels', False):
+            self.label_matcher = pattern_builder.LabelMatcher(
+                self.pattern_builder,
+                {name: field.labels for name, field in self.fields.iteritems()})
+
+    #The layout profiles that extract.layout_device knows.
+    LAYOUT_PROFILES = ['full', 'fast']
+
+    def layout(self):
+        """ Get the settings for PDFMiner layout analysis.
+
+        :return: A dict with the layout profile ('full' by default, or 'fast'
+         to skip grouping boxes into a reading order) and a dict of LAParams
+         keyword arguments overriding the profile's (see extract.layout_device).
+        """
+        layout = self._data.get('layout') or {}
+        profile = layout.get('profile', 'full')
+        if profile not in self.LAYOUT_PROFILES:
+            raise ValueError("Unknown layout profile: %s" % profile)
+        return {'profile': profile, 'laparams': dict(layout.get('laparams') or {})}
+
+    def page_cutoff(self, names=None):
+        """ Get the number of leading pages that the candidate finders of all fields look at.
+
+        Only max_page is used, so pages before a finder's min_page are included.
+        :param names: The names of the fields to consider (by default, all of them).
+        :return: The number of pages, or None if some finder looks at every page.
+        """
+        if names is None:
+            names = self.fields.keys()
+        lasts = [self.fields[name].page_range()[1] for name in names]
+        if not lasts or None in lasts:
+            return None
+        return max(lasts) + 1
+
     # TODO: the following would probably fit better somewhere else
     def strip_labels(self, text):
         """ Remove all field labels from some text.
         :param text: A string from which to remove labels.
         :return: A list of strings formed by removing labels from the text.
         """
-        labels = sum([field.labels for field in self.fields.values()], self._extra_labels)
-        pattern = self.pattern_builder.list_pattern(labels)
-        if pattern is None:
-            return text
-        return re.split(pattern, text)
+        return self._label_regex.split(text)
 
     def map_tables(self):
         """ Map the Document, Box, and Line classes to their SQL tables."""
@@ -1,17 +1,31 @@
 from settings import Settings
 from argparse import ArgumentParser
-from extract import extract_pdf_data
-from pdf_classes import *
-import os
+from ingest import ingest, backfill
+from migrate import migrate
 
 
 if __name__ == "__main__":
     parser = ArgumentParser(description='Set up database')
     parser.add_argument('--schema', help='install the schema', action='store_true')
+    parser.add_argument('--migrate', help='add missing tables, columns and indexes to an existing database',
+                        action='store_true')
     parser.add_argument('--settings', help='the path to the settings file',
                            default=None)
+    parser.add_argument('--workers', help='the number of processes to use for layout analysis',
+                        type=int, default=1)
+    parser.add_argument('--bulk', help='save boxes and lines with bulk inserts',
+                        action='store_true')
+    parser.add_argument('--checkpoint-pages', help='commit each file every N pages, so that '
+                        'extraction of large files can be resumed', type=int, default=None)
+    parser.add_argument('--needed-pages', help='only extract the pages that the candidate '
+                        'finders of the configured fields look at', action='store_true')
+    parser.add_argument('--backfill', help='extract the pages left out by --needed-pages '
+                        '(with --needed-pages, only up to the current cutoff)',
+                        action='store_true')
 
     args = parser.parse_args()
+    if args.checkpoint_pages is not None and args.workers > 1:
+        parser.error("--checkpoint-pages can't be used with more than one worker")
     settings = Settings(args.settings)
     metadata = settings.map_tables()
 
@@ -19,24 +33,20 @@ if __name__ == "__main__":
     if args.schema:
         #Just install the schema.
         metadata.create_all(settings.engine())
+    elif args.migrate:
+        migrate(settings.engine(), metadata)
     else:
-        #Extract all of the PDFs in the pdf directory to the database.
+        page_cutoff = settings.page_cutoff() if args.needed_pages else None
+        if args.needed_pages:
+            print("Extracting %s pages" % ("all" if page_cutoff is None else
+                                           "the first %d" % page_cutoff))
         session = settings.session()
-        pdf_dir = settings.get_directory('pdf')
-
-        existing = [fn[0] for fn in session.query(Document.filename)]
-        labels = settings.load_labels()
-
-        for filename in os.listdir(pdf_dir):
-            if filename not in existing:
-                file_labels = labels.get(filename, {})
-
-                try:
-                    with open(os.path.join(pdf_dir, filename), "r") as fp:
-                        extract_pdf_data(fp, settings.test_proportion, file_labels, session)
-                except Exception as e:
-                    session.rollback()
-                    print (filename, e)
+        if args.backfill:
+            backfill(settings, session, page_cutoff)
+        else:
+            #Extract all of the PDFs in the pdf directory to the database.
+            ingest(settings, session, args.workers, args.bulk, args.checkpoint_pages,
+                   page_cutoff)
 
 
         #query=Document.update().values(Document.is_test=1)
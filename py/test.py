@@ -1,11 +1,13 @@
 from settings import Settings
-from sqlalchemy.orm import joinedload
-import pandas as pd
-import pickle
+from export_format import FORMATS, read_export
+from candidate_data import CandidateData
+import numpy as np
 import yaml
 import os
 from argparse import ArgumentParser
-from pdf_classes import *
+from document_loader import load_compact_documents
+from model_registry import load_model
+import copy
 
 if __name__ == "__main__":
     parser = ArgumentParser(description='Evaluate a model on the test set')
@@ -15,6 +17,8 @@ if __name__ == "__main__":
                         default=None)
     parser.add_argument('--token', help='a token for exported data',
                         default=None)
+    parser.add_argument('--format', help='the file format of the exported data',
+                        choices=FORMATS, default='csv')
     args = parser.parse_args()
 
     settings = Settings(args.settings)
@@ -25,9 +29,8 @@ if __name__ == "__main__":
     field_name = model_def['field']
     field = settings.fields[field_name]
 
-    with open(os.path.join(settings.get_directory('pickle'),
-                           '%s.pkl' % args.model_file), 'r') as f:
-        wrapper = pickle.load(f)
+    #The registry's model is shared, so its data is set on a copy.
+    wrapper = copy.copy(load_model(settings.get_directory('pickle'), args.model_file))
 
     y = []
     X = []
@@ -36,34 +39,25 @@ if __name__ == "__main__":
     session = settings.session()
     token = args.token
 
-    #Attempt to preload candidate data from CSV files.
+    #Attempt to preload exported candidate data.
     if token:
         csv_dir = settings.get_directory('csv')
-        features = pd.read_csv(os.path.join(csv_dir, '%s_test_features.%s.csv'
-                                            % (field_name, token)), index_col=range(3))
-        scores = pd.read_csv(os.path.join(csv_dir, '%s_test_scores.%s.csv'
-                                          % (field_name, token)), index_col=range(3))['%s_score'%field_name]
-        values = pd.read_csv(os.path.join(csv_dir, '%s_test_value.%s.csv'
-                                          % (field_name, token)), index_col=range(3))['%s_value'%field_name]
+        features, scores, values = read_export(args.format, csv_dir, field_name,
+                                               'test', token)
 
 
-    for document in session.query(Document).options(joinedload(Document.lines))\
-            .filter(Document.is_test == 1):
+    #Exported data only needs the documents' labels, not their lines and boxes.
+    for document in load_compact_documents(session, is_test=True, layout=not token):
         y.append(getattr(document, field_name))
-        # Delete the field value from X to prevent cheating.
-        delattr(document, field_name)
+        # Clear the field value from X to prevent cheating. Unlike an ORM
+        # Document, a CompactDocument has no attribute left once deleted.
+        setattr(document, field_name, None)
         X.append(document)
 
-        if token:
-            try:
-                document.features = {field_name: features.xs(document.id, level='document', drop_level=False)}
-                document.scores = {field_name: scores.xs(document.id, level='document', drop_level=False)}
-                document.values = {field_name: values.xs(document.id, level='document', drop_level=False)}
-            except KeyError as e:
-                #Nothing found, but set them to empty to avoid trying to compute again later.
-                document.features = {field_name: []}
-                document.scores = {field_name: []}
-                document.values = {field_name: []}
+    if token:
+        #Score the exported data, referring to documents by position.
+        wrapper.data = CandidateData([document.id for document in X], features, scores, values)
+        X = np.arange(len(X))
 
     print(wrapper.score(X, y))
 
@@ -0,0 +1,152 @@
+"""Tests for reusing cached candidate data and invalidating it."""
+
+import copy
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from candidate_cache import CandidateCache
+from candidate_data import document_entries
+
+
+class FakeSettings(object):
+    def __init__(self):
+        self.replacements = {'0': 'O'}
+        self.all_labels = ['Title']
+
+    def substitutions(self):
+        return self.replacements
+
+
+class FakeCandidate(object):
+    def __init__(self, document_id, num, value):
+        self.id = (document_id, 0, num)
+        self.value = value
+
+
+class FakeField(object):
+    """A field whose candidates depend on its definition, substitutions and labels.
+
+    It counts the documents it finds candidates for and the feature values it computes.
+    """
+    name = 'title'
+
+    def __init__(self):
+        self.settings = FakeSettings()
+        self._data = {'candidate_finders': {'words': {'parameters': {'step': 1}}},
+                      'features': {'length': {'class': 'Length'},
+                                   'upper': {'class': 'UpperCount'}}}
+        self.features = dict.fromkeys(self._data['features'])
+        self.candidate_calls = 0
+        self.feature_calls = dict.fromkeys(self.features, 0)
+
+    def get_candidates(self, document):
+        self.candidate_calls += 1
+        step = self._data['candidate_finders']['words']['parameters']['step']
+        words = document.text.split()[::step] + self.settings.all_labels
+        for old, new in self.settings.replacements.items():
+            words = [word.replace(old, new) for word in words]
+        return [FakeCandidate(document.id, num, word) for num, word in enumerate(words)]
+
+    def features_dataframe(self, candidates_by_doc, names):
+        candidates = [c for doc_candidates in candidates_by_doc for c in doc_candidates]
+        functions = {'length': len, 'upper': lambda value: sum(c.isupper() for c in value)}
+        columns = {}
+        for name in names:
+            self.feature_calls[name] += len(candidates)
+            columns[name] = [float(functions[name](c.value)) for c in candidates]
+        index = pd.MultiIndex.from_tuples([c.id for c in candidates],
+                                          names=['document', 'finder', 'num'])
+        return pd.DataFrame(columns, index=index, columns=sorted(columns)).sort_index()
+
+    def compare(self, label, value):
+        return float(label == value)
+
+
+class FakeDocument(object):
+    def __init__(self, document_id, text, title):
+        self.id = document_id
+        self.text = text
+        self.title = title
+
+
+DOCUMENTS = [FakeDocument(1, "A Title of Note", "Note"),
+             FakeDocument(2, "another one here", "one"),
+             FakeDocument(3, "", None)]
+
+
+class CandidateCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _entries(self, field, documents=DOCUMENTS):
+        #A new cache for each run, as each export makes one.
+        return document_entries(field, documents, CandidateCache(self.directory))
+
+    def assertEntriesEqual(self, entries, expected):
+        self.assertEqual(len(entries), len(expected))
+        for entry, other in zip(entries, expected):
+            self.assertEqual(entry['ids'], other['ids'])
+            self.assertEqual(entry['values'], other['values'])
+            self.assertEqual(list(entry['scores']), list(other['scores']))
+            self.assertEqual(sorted(entry['features']), sorted(other['features']))
+            for name in entry['features']:
+                np.testing.assert_array_equal(entry['features'][name], other['features'][name])
+
+    def _check_invalidated(self, change):
+        self._entries(FakeField())
+        field = FakeField()
+        change(field)
+        expected = document_entries(copy.deepcopy(field), DOCUMENTS)
+        self.assertEntriesEqual(self._entries(field), expected)
+        self.assertEqual(field.candidate_calls, len(DOCUMENTS))
+
+    def test_hit_matches_cold_run(self):
+        cold = document_entries(FakeField(), DOCUMENTS)
+        self.assertEntriesEqual(self._entries(FakeField()), cold)
+        field = FakeField()
+        self.assertEntriesEqual(self._entries(field), cold)
+        self.assertEqual(field.candidate_calls, 0)
+        self.assertEqual(field.feature_calls, {'length': 0, 'upper': 0})
+
+    def test_definition_invalidates(self):
+        def change(field):
+            field._data['candidate_finders']['words']['parameters']['step'] = 2
+        self._check_invalidated(change)
+
+    def test_substitutions_invalidate(self):
+        def change(field):
+            field.settings.replacements = {'l': '1'}
+        self._check_invalidated(change)
+
+    def test_labels_invalidate(self):
+        def change(field):
+            field.settings.all_labels = ['Title', 'Name']
+        self._check_invalidated(change)
+
+    def test_changed_feature_recomputed_alone(self):
+        self._entries(FakeField())
+        field = FakeField()
+        field._data['features']['upper'] = {'class': 'UpperCount', 'parameters': {}}
+        self._entries(field)
+        self.assertEqual(field.candidate_calls, len(DOCUMENTS))
+        self.assertEqual(field.feature_calls['length'], 0)
+        self.assertGreater(field.feature_calls['upper'], 0)
+
+    def test_changed_label_rescored(self):
+        self._entries(FakeField())
+        documents = copy.deepcopy(DOCUMENTS)
+        documents[0].title = "Title"
+        field = FakeField()
+        entries = self._entries(field, documents)
+        self.assertEqual(field.candidate_calls, 0)
+        self.assertEntriesEqual(entries, document_entries(FakeField(), documents))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Tests for picking the best candidate of each document."""
+
+import unittest
+import numpy as np
+import pandas as pd
+
+from candidate_data import CandidateData
+from estimators import ModelWrapper, best_values
+
+
+def _series(rows, name):
+    """Build a Series indexed by candidate id from (document, num, value) rows."""
+    index = pd.MultiIndex.from_tuples([(document, 0, num) for document, num, _ in rows],
+                                      names=['document', 'finder', 'num'])
+    return pd.Series([value for _, _, value in rows], index=index, name=name)
+
+
+def idxmax_values(scores, values):
+    """Find the best values with idxmax on each document, as best_values replaced."""
+    best = {}
+    for document, group in scores.groupby(level='document'):
+        if group.isnull().all():
+            best[document] = None
+        else:
+            best[document] = values[group.idxmax()]
+    return best
+
+
+class BestValuesTest(unittest.TestCase):
+    def _check(self, rows):
+        scores = _series([(d, n, s) for d, n, s, _ in rows], 'score').sort_index()
+        values = _series([(d, n, v) for d, n, _, v in rows], 'value').sort_index()
+        best = best_values(scores, values)
+        self.assertEqual(best, idxmax_values(scores, values))
+        return best
+
+    def test_ties_go_to_first_candidate(self):
+        best = self._check([(1, 0, .5, 'a'), (1, 1, .9, 'b'), (1, 2, .9, 'c'),
+                            (2, 0, .2, 'd'), (2, 1, .2, 'e')])
+        self.assertEqual(best, {1: 'b', 2: 'd'})
+
+    def test_all_missing_scores(self):
+        best = self._check([(1, 0, np.nan, 'a'), (1, 1, np.nan, 'b'),
+                            (2, 0, np.nan, 'c'), (2, 1, .1, 'd')])
+        self.assertEqual(best, {1: None, 2: 'd'})
+
+    def test_single_candidates(self):
+        best = self._check([(1, 0, -1., 'a'), (3, 5, 0., 'b'), (4, 0, np.nan, 'c')])
+        self.assertEqual(best, {1: 'a', 3: 'b', 4: None})
+
+    def test_no_candidates(self):
+        self.assertEqual(best_values(pd.Series([], dtype=float), pd.Series([], dtype=object)), {})
+
+
+class FakeField(object):
+    name = 'title'
+
+
+class ProbabilityTest(unittest.TestCase):
+    def test_predict_with_probability(self):
+        rows = [(1, 0), (1, 1), (2, 0), (2, 1)]
+        index = pd.MultiIndex.from_tuples([(d, 0, n) for d, n in rows],
+                                          names=['document', 'finder', 'num'])
+        features = pd.DataFrame({'x': [0., 1., 1., 0.]}, index=index)
+        scores = pd.Series([False, True, True, False], index=index)
+        values = pd.Series(['a', 'b', 'c', 'd'], index=index, dtype=object)
+        data = CandidateData([1, 2], features, scores, values)
+        model = ModelWrapper(FakeField(), model_module='sklearn.linear_model',
+                             model_class='LogisticRegression', use_probability=True, data=data)
+        model.fit(np.arange(2), None)
+        self.assertEqual(list(model.predict(np.arange(2))), ['b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Tests for merging exported candidate data written in parts."""
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import export_format
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def _chunk(document_id, features, scores, values):
+    """Build the features, scores and values of one document's candidates."""
+    index = pd.MultiIndex.from_tuples([(document_id, 0, i) for i in range(len(scores))])
+    return (pd.DataFrame({'offset': features}, index=index),
+            pd.DataFrame({'title_score': scores}, index=index),
+            pd.DataFrame({'title_value': values}, index=index, dtype=object))
+
+
+#The first part's features and scores are integers and its values all missing.
+PARTS = [_chunk(1, np.array([-100, -100]), np.array([True, False]), [None, None]),
+         _chunk(2, np.array([3.5, np.nan]), np.array([0.5, 1.0]), [u'x', u'y'])]
+
+
+class MergePartsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, fmt, token, chunks):
+        writer = export_format.open_writer(fmt, self.directory, 'title', 'training', token)
+        for chunk in chunks:
+            writer.write(*chunk)
+        writer.close()
+
+    def _check_merge(self, fmt):
+        self._write(fmt, 'single', PARTS)
+        for i, part in enumerate(PARTS):
+            self._write(fmt, 'part%d' % i, [part])
+        export_format.merge_parts(fmt, self.directory, 'title', 'training',
+                                  ['part0', 'part1'], 'merged')
+
+        merged = export_format.read_export(fmt, self.directory, 'title', 'training', 'merged')
+        single = export_format.read_export(fmt, self.directory, 'title', 'training', 'single')
+        features, scores, values = merged
+        np.testing.assert_array_equal(features['offset'].values, [-100., -100., 3.5, np.nan])
+        np.testing.assert_array_equal(scores.values, [1., 0., .5, 1.])
+        self.assertEqual(list(values.values[2:]), [u'x', u'y'])
+        pd.testing.assert_frame_equal(features, single[0])
+        pd.testing.assert_series_equal(scores, single[1])
+        pd.testing.assert_series_equal(values, single[2])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        self._check_merge('parquet')
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_feather(self):
+        self._check_merge('feather')
+
+    def test_npy(self):
+        self._check_merge('npy')
+
+    def test_csv(self):
+        self._check_merge('csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
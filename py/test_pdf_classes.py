@@ -0,0 +1,84 @@
+"""Tests for the spatial index over the lines of a page."""
+
+import random
+import unittest
+
+from pdf_classes import Document, Box, Line, PageIndex
+
+
+def scan_below(lines, line, ymin):
+    """Find the next line below by scanning every line, as PageIndex.next_below should."""
+    best = None
+    for cand in lines:
+        if cand.page == line.page and cand.x1 >= line.x0 and cand.x0 <= line.x1 and \
+                ymin < cand.y1 < line.y0 and (best is None or cand.y0 > best.y0):
+            best = cand
+    return best
+
+
+def scan_right(lines, line, xmax):
+    """Find the next line to the right by scanning every line, as PageIndex.next_right should."""
+    best = None
+    for cand in lines:
+        if cand.page == line.page and \
+                (cand.y0 <= 0.25 * line.y0 + 0.75 * line.y1 <= cand.y1 or
+                 cand.y0 <= 0.75 * line.y0 + 0.25 * line.y1 <= cand.y1) and \
+                line.x1 < cand.x0 < xmax and (best is None or cand.x0 < best.x0):
+            best = cand
+    return best
+
+
+def random_document(seed, num_lines=200):
+    """Make a two-page document of lines on a coarse grid.
+
+    The grid makes lines share coordinates, and lines up to three bands
+    high straddle band boundaries.
+    """
+    rng = random.Random(seed)
+    document = Document(num_pages=2)
+    for page in range(2):
+        box = Box(document=document, page=page, x0=0, y0=0, x1=600, y1=800, vertical=False)
+        for _ in range(num_lines):
+            x0 = 5 * rng.randint(0, 100)
+            y0 = 5 * rng.randint(0, 140)
+            Line(document=document, box=box, page=page, x0=x0, y0=y0,
+                 x1=x0 + 5 * rng.randint(0, 30), y1=y0 + 2.5 * rng.randint(0, 24),
+                 vertical=False, text='')
+    return document
+
+
+class PageIndexTest(unittest.TestCase):
+    def test_matches_scan(self):
+        for seed in range(5):
+            document = random_document(seed)
+            lines = document.get_lines()
+            for line in lines:
+                index = document.page_index(line.page)
+                for gap in (10, 45, 1000):
+                    self.assertIs(index.next_below(line, line.y0 - gap),
+                                  scan_below(lines, line, line.y0 - gap))
+                    self.assertIs(index.next_right(line, line.x1 + gap),
+                                  scan_right(lines, line, line.x1 + gap))
+
+    def test_ties_keep_document_order(self):
+        document = Document()
+        box = Box(document=document, page=0, x0=0, y0=0, x1=100, y1=100, vertical=False)
+        kwargs = dict(document=document, box=box, page=0, vertical=False, text='')
+        line = Line(x0=0, y0=50, x1=10, y1=60, **kwargs)
+        first_below = Line(x0=0, y0=30, x1=10, y1=40, **kwargs)
+        Line(x0=5, y0=30, x1=15, y1=38, **kwargs)
+        first_right = Line(x0=20, y0=50, x1=30, y1=60, **kwargs)
+        Line(x0=20, y0=41, x1=25, y1=59, **kwargs)
+        index = document.page_index(0)
+        self.assertIs(index.next_below(line, 0), first_below)
+        self.assertIs(index.next_right(line, 100), first_right)
+
+    def test_empty_page(self):
+        document = random_document(0, num_lines=1)
+        line = document.get_lines()[0]
+        self.assertIsNone(document.page_index(5).next_below(line, -1000))
+        self.assertIsNone(PageIndex([]).next_right(line, 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
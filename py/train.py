@@ -1,13 +1,14 @@
 import estimators
 from settings import Settings
-from sqlalchemy.orm import joinedload
 from sklearn.grid_search import GridSearchCV
-import pandas as pd
-import pickle
+from export_format import FORMATS, read_export
+from candidate_data import CandidateData
+import numpy as np
 import yaml
 import os
 from argparse import ArgumentParser
-from pdf_classes import *
+from document_loader import load_compact_documents
+from model_registry import save_model
 
 if __name__ == "__main__":
     parser = ArgumentParser(description='Choose model parameters by cross-validation')
@@ -17,6 +18,8 @@ if __name__ == "__main__":
                         default=None)
     parser.add_argument('--token', help='a token for exported data',
                         default=None)
+    parser.add_argument('--format', help='the file format of the exported data',
+                        choices=FORMATS, default='csv')
     args = parser.parse_args()
 
     settings = Settings(args.settings)
@@ -31,55 +34,43 @@ if __name__ == "__main__":
     n_jobs = model_def.get('n_jobs', 1)
     use_probability = model_def.get('use_probability', False)
 
-    wrapper = estimators.ModelWrapper(field, model_def['threshold'], model_def['module'],
-                                      model_def['class'], model_params=parameters,
-                                      use_probability=use_probability)
-
     y = []
-    X = []
+    documents = []
 
     settings.map_tables()
     session = settings.session()
     token = args.token
 
-    #Attempt to preload candidate data from CSV files.
+    #Exported data only needs the documents' labels, not their lines and boxes.
+    for document in load_compact_documents(session, is_test=False, layout=not token):
+        y.append(getattr(document, field_name))
+        documents.append(document)
+
+    #Load exported candidate data, or find candidates and compute features now.
+    #Either way this is done once and shared by every fold and grid point.
     if token:
         csv_dir = settings.get_directory('csv')
-        features = pd.read_csv(os.path.join(csv_dir, '%s_training_features.%s.csv'
-                                            % (field_name, token)), index_col=range(3))
-        scores = pd.read_csv(os.path.join(csv_dir, '%s_training_scores.%s.csv'
-                                          % (field_name, token)), index_col=range(3))['%s_score'%field_name]
-        values = pd.read_csv(os.path.join(csv_dir, '%s_training_value.%s.csv'
-                                          % (field_name, token)), index_col=range(3))['%s_value'%field_name]
+        features, scores, values = read_export(args.format, csv_dir, field_name,
+                                               'training', token)
+        data = CandidateData([document.id for document in documents],
+                             features, scores, values)
+    else:
+        data = CandidateData.from_documents(field, documents)
+    X = np.arange(len(documents))
 
-
-    for document in session.query(Document).options(joinedload(Document.lines))\
-            .filter(Document.is_test == 0):
-        y.append(getattr(document, field_name))
-        # Delete the field value from X to prevent cheating.
-        delattr(document, field_name)
-        X.append(document)
-
-        if token:
-            try:
-                document.features = {field_name: features.xs(document.id, level='document', drop_level=False)}
-                document.scores = {field_name: scores.xs(document.id, level='document', drop_level=False)}
-                document.values = {field_name: values.xs(document.id, level='document', drop_level=False)}
-            except KeyError as e:
-                #Nothing found, but set them to empty to avoid trying to compute again later.
-                document.features = {field_name: []}
-                document.scores = {field_name: []}
-                document.values = {field_name: []}
+    wrapper = estimators.ModelWrapper(field, model_def['threshold'], model_def['module'],
+                                      model_def['class'], model_params=parameters,
+                                      use_probability=use_probability, data=data)
 
     #Set up grid search cross-validation and fit the model.
     gs = GridSearchCV(wrapper, param_grid=model_def['parameter_grid'],
                       cv=model_def['folds'], n_jobs=n_jobs)
     gs.fit(X, y)
+    #The training data shouldn't be saved with the model.
+    gs.best_estimator_.data = None
 
-    #Dump the best estimator to a pickle file.
-    dest = os.path.join(settings.get_directory('pickle'), '%s.pkl' % args.model_file)
-    with open(dest, 'w') as f:
-        pickle.dump(gs.best_estimator_, f)
+    #Dump the best estimator to pickle and joblib files.
+    dest = save_model(gs.best_estimator_, settings.get_directory('pickle'), args.model_file)
 
     #Print some things.
     print(gs.grid_scores_)